@@ -1,73 +1,473 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, request
 from flask_cors import CORS
+import base64
+import hmac
+import io
+import json
 import os
+import re
+import sqlite3
+import time
+import zlib
 
-from init_db import init_db, get_db_connection
+from init_db import init_db, DATABASE, MIGRATIONS
+from connection_pool import get_pool, get_stream_pool
+from bulk_import import BATCH_SIZE, import_prompt_list
+from response_cache import create_cache
+from json_encoding import encode_array, encode_envelope
+from shard_router import ShardRouter
+from change_feed import change_notifier, get_last_change_id, record_changes, stream_changes
+from write_queue import WRITE_BEHIND, get_write_queue
+from snapshot import get_snapshot_directory, snapshot_databases
+from metrics import CONNECTION_ACQUIRE_DURATION, ENCODE_DURATION, REQUEST_DURATION, RESPONSE_SIZE, current_route, render_metrics
+from queries import (
+    BUMP_PROJECT_VERSION_QUERY, BUMP_PROMPT_PROJECT_VERSION_QUERY, BUMP_PROMPT_VERSION_QUERY, CHAIN_DIRECTIONS, CHAIN_PROMPT_DETAIL_COLUMNS,
+    CHAIN_PROMPT_ID_COLUMNS, CHAIN_PROMPTS_QUERY, CHILD_PROMPT_QUERY, EXPORT_QUERIES, FIRST_PROJECT_QUERY, INSERT_NODE_QUERY,
+    INSERT_NOTE_QUERY, INSERT_PROMPT_QUERY, NODES_LIST_QUERY, NODES_PAGE_QUERY, NOTES_AFTER_WHERE, NOTES_LIST_QUERY, NOTES_PAGE_QUERY,
+    NOTES_WHERE, PROJECT_EXISTS_QUERY, PROJECT_QUERY, PROJECTS_QUERY, PROMPT_CHAIN_QUERY, PROMPT_EXISTS_QUERY, PROMPT_PROJECT_QUERY,
+    PROMPT_QUERY, PROMPT_VERSION_QUERY, SEARCH_QUERY, TREE_NODES_QUERY
+)
 
 app = Flask(__name__)
 CORS(app)
+response_cache = create_cache()
+shard_router = ShardRouter(DATABASE)
 
-DEFAULT_RESPONSE_BODY = {
-    "responseCode": None,
-    "responseMessage": None,
-}
+"""
+Encode the response envelope, and record the encoding time and the response code for the request metrics
+"""
+def encode_response(response_code, response_message, body=None, encoded_fields=None):
+    started_at = time.perf_counter()
+    data = encode_envelope(response_code, response_message, body, encoded_fields)
+    ENCODE_DURATION.observe(time.perf_counter() - started_at, current_route.get())
+    g.response_code = response_code
+    return data
+
+def make_response(body=None, response_code=None, response_message=None, etag=None):
+    response = Response(encode_response(response_code, response_message, body), mimetype="application/json")
+    if etag:
+        set_etag(response, etag)
+    return response
+
+"""
+Make a response whose fields are already encoded as JSON, which skips building a Python object for every row of large lists
+"""
+def make_encoded_response(encoded_fields, body=None, response_code=None, response_message=None, etag=None):
+    response = Response(encode_response(response_code, response_message, body, encoded_fields), mimetype="application/json")
+    if etag:
+        set_etag(response, etag)
+    return response
+
+"""
+Conditional GET support based on the version counters of projects and prompts
+
+- The ETag of a response is derived from the version of the project or prompt it is built from, which is bumped on every write
+- When the request's If-None-Match matches the current ETag, a 304 response is returned without reading the row data
+- Cache-Control: no-cache makes clients revalidate on every request, so they never use a stale response
+"""
+def set_etag(response, etag):
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def is_not_modified(etag):
+    return request.if_none_match.contains(etag)
+
+def make_not_modified_response(etag):
+    return set_etag(Response(status=304), etag)
+
+"""
+Read-through cache of the serialized /tree, /prompts/:id and /prompts/:id/nodes responses
+
+- Only successful responses are cached, together with their ETag, which is derived from the version of the project or prompt
+- A cached response is only served if its ETag matches the current version, which the handlers look up with one indexed query first,
+  so a response stored by a read that raced with a write is never served
+- The handlers read the version and the response data in the same read transaction, so a cached response always matches its ETag
+- The write handlers invalidate the keys of the responses they change after committing, which frees the outdated entries right away
+"""
+TREE_CACHE_EXPANDS = ("", "prompts", "nodes,prompts")
+
+def get_tree_cache_key(project_id, expand):
+    return f"tree:{project_id}:{','.join(sorted(expand))}"
+
+def get_cached_response(key, etag):
+    cached = response_cache.get(key)
+    if cached is None:
+        return None
+    cached_etag, body = cached.split(b"\n", 1)
+    if cached_etag.decode() != etag:
+        return None
+    return set_etag(Response(body, mimetype="application/json"), etag)
+
+def cache_response(key, response, etag):
+    response_cache.set(key, etag.encode() + b"\n" + response.get_data())
+    return response
+
+def invalidate_tree_cache(project_id):
+    response_cache.delete(*(f"tree:{project_id}:{expand}" for expand in TREE_CACHE_EXPANDS))
+
+"""
+Invalidate the cached responses of a prompt after a write
+
+- Any write to a prompt bumps its version, which is part of the ETag of both the prompt and nodes responses
+- Nodes are also part of the expanded tree, whose ETag depends on the project version which is bumped as well,
+  so the tree of the project is invalidated when its ID is given
+"""
+def invalidate_prompt_cache(prompt_id, project_id=None):
+    keys = [f"prompt:{prompt_id}", f"nodes:{prompt_id}"]
+    if project_id is not None:
+        keys.extend(f"tree:{project_id}:{expand}" for expand in TREE_CACHE_EXPANDS)
+    response_cache.delete(*keys)
+
+"""
+Request metrics, recorded for every route
+
+- The route label is the URL rule (for example /prompts/<int:prompt_id>), so the metrics of a route are not split by ID
+- The status label is the responseCode of the envelope, as the API returns errors with a 200 status
+- The duration is measured until the response is returned, which doesn't include sending a streamed response
+- The route is also set for the SQL metrics, which are recorded by the instrumented connections of connection_pool.py
+"""
+@app.before_request
+def start_request_metrics():
+    g.request_started_at = time.perf_counter()
+    g.route = request.url_rule.rule if request.url_rule else "unmatched"
+    current_route.set(g.route)
+
+@app.after_request
+def record_request_metrics(response):
+    if "request_started_at" in g:
+        status = g.get("response_code", response.status_code)
+        REQUEST_DURATION.observe(time.perf_counter() - g.request_started_at, g.route, request.method, status)
+        # Streamed responses have no Content-Length, and are not buffered to measure them
+        if response.content_length is not None:
+            RESPONSE_SIZE.observe(response.content_length, g.route, request.method)
+    return response
+
+"""
+GET /metrics — returns the request, SQL and cache metrics in the Prometheus text format
+"""
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    cache_stats = response_cache.stats()
+    cache_metrics = [
+        (f"response_cache_{name}_total", "counter", f"Response cache {name}", cache_stats[name])
+        for name in ("hits", "misses", "evictions") if isinstance(cache_stats.get(name), int)
+    ]
+    if isinstance(cache_stats.get("entries"), int):
+        cache_metrics.append(("response_cache_entries", "gauge", "Entries in the response cache", cache_stats["entries"]))
+    return Response(render_metrics(cache_metrics), mimetype="text/plain; version=0.0.4")
+
+"""
+GET /cache/stats — returns the hit, miss and eviction counters of the response cache
+"""
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return make_response(body=response_cache.stats(), response_code=200, response_message="Success")
+
+"""
+Get the connection to a database file for the current request, which is the main database by default
+
+- The connection is checked out of the pool on first use and is returned to the pool when the app context is torn down
+- This also covers the error paths, so a handler never has to close the connection itself
+- The handlers of a prompt use the database returned by the shard router, as the prompt might be stored in its project's own database
+"""
+def get_db(database=DATABASE):
+    if "database_connections" not in g:
+        g.database_connections = {}
+    if database not in g.database_connections:
+        started_at = time.perf_counter()
+        g.database_connections[database] = get_pool(database).acquire()
+        CONNECTION_ACQUIRE_DURATION.observe(time.perf_counter() - started_at, current_route.get())
+    return g.database_connections[database]
+
+@app.teardown_appcontext
+def release_db(exception):
+    for database, database_connection in g.pop("database_connections", {}).items():
+        get_pool(database).release(database_connection)
+
+"""
+GET /healthz — liveness probe
+
+- This only checks that the process serves requests, and doesn't touch the database, so a busy database never gets a worker restarted
+"""
+@app.route("/healthz", methods=["GET"])
+def get_health():
+    return make_response(body={"pid": os.getpid()}, response_code=200, response_message="Alive")
+
+"""
+GET /readyz — readiness probe
+
+- This checks that a connection to the main database can be checked out of the pool and that its schema is at the latest version
+- Unlike the other endpoints, a worker that is not ready also responds with a 503 HTTP status, as probes and load balancers only look at the status
+"""
+@app.route("/readyz", methods=["GET"])
+def get_readiness():
+    try:
+        schema_version = get_db().execute("SELECT COALESCE(MAX(version), 0) FROM SCHEMA_VERSION").fetchone()[0]
+        result = {
+            "pid": os.getpid(),
+            "schemaVersion": schema_version
+        }
+        if schema_version != MIGRATIONS[-1][0]:
+            response = make_response(body=result, response_code=503, response_message="Schema is not at the latest version")
+            response.status_code = 503
+            return response
+        return make_response(body=result, response_code=200, response_message="Ready")
+    except Exception as e:
+        print(f"Error checking readiness: {e}")
+        response = make_response(body=None, response_code=503, response_message="Database unavailable")
+        response.status_code = 503
+        return response
+
+MAX_PAGE_LIMIT = 1000
+STREAM_BATCH_SIZE = 500
+
+"""
+Parse the pagination query parameters shared by the list endpoints
+
+- limit is the maximum number of rows in a page and is optional, without it the whole list is returned
+- after is the cursor returned as nextCursor by the previous page
+- stream=ndjson streams every row as a line of JSON instead of building a single response
+- A ValueError is raised for invalid values, which the handlers report as a 400 response
+"""
+def parse_page_args():
+    limit = request.args.get("limit")
+    if limit is not None:
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_PAGE_LIMIT:
+            raise ValueError(f"Limit must be between 1 and {MAX_PAGE_LIMIT}")
+        limit = int(limit)
+    stream = request.args.get("stream")
+    if stream is not None and stream != "ndjson":
+        raise ValueError("Stream supports only ndjson")
+    return limit, request.args.get("after"), stream is not None
+
+"""
+Decode the cursor of the nodes list, which is the ID of the last node in a page
+"""
+def decode_node_cursor(cursor):
+    if not cursor.isdigit():
+        raise ValueError("Invalid cursor")
+    return int(cursor)
+
+"""
+Encode and decode the opaque cursor of the notes list, which is the (created_at, note_id) position of the last note in a page
+"""
+def encode_note_cursor(created_at, note_id):
+    return base64.urlsafe_b64encode(json.dumps([created_at, note_id]).encode()).decode()
+
+def decode_note_cursor(cursor):
+    try:
+        created_at, note_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), int(note_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+"""
+Stream the rows of a query as newline delimited JSON
+
+- The last column of the query is the JSON of the row, which is built by SQLite with json_object
+- The rows are read in batches with fetchmany, so memory stays flat regardless of the number of rows
+- The stream uses a connection of the stream pool, as it keeps running after the request's connection is returned to the pool
+  and holds its connection until the client has read every row
+"""
+def stream_ndjson(database, query, params):
+    def generate():
+        pool = get_stream_pool(database)
+        database_connection = pool.acquire()
+        try:
+            database_cursor = database_connection.cursor()
+            database_cursor.row_factory = None
+            database_cursor.execute(query, params)
+            while True:
+                rows = database_cursor.fetchmany(STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                yield "".join(row[-1] + "\n" for row in rows)
+        finally:
+            pool.release(database_connection)
+    return Response(generate(), mimetype="application/x-ndjson")
+
+TREE_EXPAND_OPTIONS = {"prompts", "nodes"}
+
+"""
+Get the prompts of a project in chain order with a recursive CTE
+
+- The chain order is defined by parent_prompt_id, so the chain is walked from the root prompt (the one without a parent) through the child of each prompt
+- The root and the child of each prompt are looked up with the unique index on parent_prompt_id, so the whole chain is read with one query
+- If a project has more than one root prompt, the chains are returned one after the other by root prompt ID
+- query_chain_prompts returns the cursor of the query, so the rows can be read in batches
+"""
+def get_chain_prompts(database_cursor, project_id, columns):
+    return query_chain_prompts(database_cursor, project_id, columns).fetchall()
 
-def make_response(body=None, response_code=None, response_message=None):
-    response = DEFAULT_RESPONSE_BODY.copy()
-    if body:
-        response.update(body)
-    response["responseCode"] = response_code
-    response["responseMessage"] = response_message
-    return jsonify(response)
+def query_chain_prompts(database_cursor, project_id, columns):
+    return database_cursor.execute(CHAIN_PROMPTS_QUERY.format(columns=columns), (project_id,))
+
+"""
+Get the details of every prompt in a project in chain order, optionally with their nodes embedded
+
+- The prompts are fetched with one query and all of their nodes with one JOIN query, which are then grouped by prompt
+- This keeps the number of queries constant instead of issuing one query per prompt
+"""
+def get_expanded_prompts(database_cursor, project_id, include_nodes=False):
+    prompt_rows = get_chain_prompts(database_cursor, project_id, CHAIN_PROMPT_DETAIL_COLUMNS)
+    prompts = []
+    prompts_by_id = {}
+    for row in prompt_rows:
+        prompt = {
+            "id": row["prompt_id"],
+            "title": row["title"],
+            "description": row["description"],
+            "parentPromptId": row["parent_prompt_id"],
+            "projectId": row["project_id"]
+        }
+        if include_nodes:
+            prompt["nodes"] = []
+        prompts.append(prompt)
+        prompts_by_id[row["prompt_id"]] = prompt
+
+    if include_nodes:
+        node_rows = database_cursor.execute(TREE_NODES_QUERY, (project_id,)).fetchall()
+        for row in node_rows:
+            prompts_by_id[row["prompt_id"]]["nodes"].append({
+                "name": row["name"],
+                "action": row["action"],
+            })
+    return prompts
+
+"""
+Parse the expand query parameter of the tree endpoints
+
+- Nodes are embedded into the prompt details, so expanding nodes implies expanding prompts
+- A ValueError is raised for unknown options, which the handlers report as a 400 response
+"""
+def parse_tree_expand():
+    expand = {option.strip() for option in request.args.get("expand", "").split(",") if option.strip()}
+    if not expand.issubset(TREE_EXPAND_OPTIONS):
+        raise ValueError("Expand supports only prompts and nodes")
+    if "nodes" in expand:
+        expand.add("prompts")
+    return expand
+
+"""
+Build the tree response of a project, which is shared by GET /tree and GET /projects/:id/tree
+
+- The project is read from the database that stores it, which has the version used in the ETag
+- A cached tree is only served if it was built from the current version of the project
+- The expanded tree is built with a fixed number of queries (one for the prompts and one for all of their nodes), regardless of the number of prompts
+- Returns None if the project doesn't exist
+"""
+def make_project_tree_response(project_id, expand):
+    database_connection = get_db(shard_router.get_project_database(project_id))
+    database_cursor = database_connection.cursor()
+    # The version and the tree are read in one read transaction, so the tree is the tree of the version in the ETag
+    database_cursor.execute("BEGIN")
+    project_row = database_cursor.execute(PROJECT_QUERY, (project_id,)).fetchone()
+    if not project_row:
+        return None
+    project = dict(project_row)
+
+    etag = f"tree-{project_id}-v{project['version']}"
+    if is_not_modified(etag):
+        return make_not_modified_response(etag)
+    cache_key = get_tree_cache_key(project_id, expand)
+    cached_response = get_cached_response(cache_key, etag)
+    if cached_response is not None:
+        return cached_response
+    if "prompts" in expand:
+        prompts = get_expanded_prompts(database_cursor, project_id, include_nodes="nodes" in expand)
+    else:
+        # Get all prompts IDs for the project in chain order
+        prompt_rows = get_chain_prompts(database_cursor, project_id, CHAIN_PROMPT_ID_COLUMNS)
+        prompts = [row["prompt_id"] for row in prompt_rows]
+    result = {
+        "project": project["name"],
+        "mainRequest": project["main_request"],
+        "finalIntegration": project.get("final_integration"),
+        "prompts": prompts
+    }
+    response = make_response(body=result, response_code=200, response_message="Success", etag=etag)
+    return cache_response(cache_key, response, etag)
 
 """
 GET /tree — returns the prompt tree
 
 - This includes project info and their associated prompt IDs
-- The prompts IDs are unique identifiers persisted in the database and will be returned in chain order
+- The prompts IDs are unique identifiers persisted in the database and will be returned in chain order, following the parent prompt links
+- With ?expand=prompts the prompt IDs are replaced by the prompt details, and ?expand=prompts,nodes also embeds each prompt's nodes
+- This returns the tree of the first project, and GET /projects/:id/tree returns the tree of any project
 """
 @app.route("/tree", methods=["GET"])
 def get_tree():
     try:
-        database_connection = get_db_connection()
-        database_cursor = database_connection.cursor()
-        response_code = 200
-        response_message = "Success"
+        try:
+            expand = parse_tree_expand()
+        except ValueError as e:
+            return make_response(body=None, response_code=400, response_message=str(e))
 
-        # Get project info
-        # As per the shared JSON file, there is only one project at the top level
-        # For multiple projects, this logic would need to be adjusted as the spec changes
-        project_row = database_cursor.execute("SELECT * FROM projects LIMIT 1").fetchone()
-        project = dict(project_row) if project_row else None
-
-        if project:
-            # Get all prompts IDs for the project in chain order
-            prompt_rows = database_cursor.execute(
-                "SELECT prompt_id FROM PROMPTS WHERE project_id = ? ORDER BY prompt_id",
-                (project["project_id"],)
-            ).fetchall()
-            prompt_ids = [row["prompt_id"] for row in prompt_rows]
-            result = {
-                "project": project["name"],
-                "mainRequest": project["main_request"],
-                "finalIntegration": project.get("final_integration"),
-                "prompts": prompt_ids
-            }
-        else:
+        # The first project is read from the catalog before the tree checks out the connection of the project's database,
+        # so the request never holds two connections of the same pool at once
+        project_rows = shard_router.query_catalog(FIRST_PROJECT_QUERY)
+        response = make_project_tree_response(project_rows[0]["project_id"], expand) if project_rows else None
+        if response is None:
             result = {
                 "project": None,
                 "mainRequest": None,
                 "finalIntegration": None,
                 "prompts": []
             }
-            response_code = 404
-            response_message = "No project found in the database"
-        database_connection.close()
-        return make_response(body=result, response_code=response_code, response_message=response_message)
+            return make_response(body=result, response_code=404, response_message="No project found in the database")
+        return response
     except Exception as e:
         print(f"Error fetching tree data: {e}")
         return make_response(body=None, response_code=500, response_message="Internal Server Error")
 
+"""
+GET /projects — returns every project
+
+- This includes the ID, name, main request and final integration of each project, ordered by ID
+- The projects are listed from the main database, which is the catalog of the projects stored in their own database files as well
+"""
+@app.route("/projects", methods=["GET"])
+def get_projects():
+    try:
+        database_connection = get_db()
+        database_cursor = database_connection.cursor()
+        project_rows = database_cursor.execute(PROJECTS_QUERY).fetchall()
+        projects = [
+            {
+                "id": row["project_id"],
+                "project": row["name"],
+                "mainRequest": row["main_request"],
+                "finalIntegration": row["final_integration"]
+            }
+            for row in project_rows
+        ]
+        return make_response(body={"projects": projects}, response_code=200, response_message="Success")
+    except Exception as e:
+        print(f"Error fetching projects: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
+"""
+GET /projects/:id/tree — returns the prompt tree of a project
+
+- This is the same response as GET /tree, with the same expand options, for the project identified by its unique ID
+"""
+@app.route("/projects/<int:project_id>/tree", methods=["GET"])
+def get_project_tree(project_id):
+    try:
+        try:
+            expand = parse_tree_expand()
+        except ValueError as e:
+            return make_response(body=None, response_code=400, response_message=str(e))
+        response = make_project_tree_response(project_id, expand)
+        if response is None:
+            return make_response(body=None, response_code=404, response_message="Project not found")
+        return response
+    except Exception as e:
+        print(f"Error fetching project tree: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
 """
 GET /prompts/:id — returns a single prompt with details
 
@@ -77,17 +477,21 @@ GET /prompts/:id — returns a single prompt with details
 @app.route("/prompts/<int:prompt_id>", methods=["GET"])
 def get_prompt(prompt_id):
     try:
-        database_connection = get_db_connection()
+        database_connection = get_db(shard_router.get_prompt_database(prompt_id))
         database_cursor = database_connection.cursor()
         response_code = 200
         response_message = "Success"
 
-        prompt_row = database_cursor.execute(
-            "SELECT * FROM PROMPTS WHERE prompt_id = ?",
-            (prompt_id,)
-        ).fetchone()
+        prompt_row = database_cursor.execute(PROMPT_QUERY, (prompt_id,)).fetchone()
 
         if prompt_row:
+            etag = f"prompt-{prompt_id}-v{prompt_row['version']}"
+            if is_not_modified(etag):
+                return make_not_modified_response(etag)
+            cache_key = f"prompt:{prompt_id}"
+            cached_response = get_cached_response(cache_key, etag)
+            if cached_response is not None:
+                return cached_response
             prompt = dict(prompt_row)
             result = {
                 "title": prompt["title"],
@@ -99,53 +503,156 @@ def get_prompt(prompt_id):
             result = None
             response_code = 404
             response_message = "Prompt not found"
-        database_connection.close()
-        return make_response(body=result, response_code=response_code, response_message=response_message)
+            return make_response(body=result, response_code=response_code, response_message=response_message)
+        response = make_response(body=result, response_code=response_code, response_message=response_message, etag=etag)
+        return cache_response(cache_key, response, etag)
     except Exception as e:
         print(f"Error fetching prompt data: {e}")
         return make_response(body=None, response_code=500, response_message="Internal Server Error")
 
+"""
+Get the ancestors or descendants of a prompt with a recursive CTE, ordered by their distance from the prompt
+
+- The first row is the prompt itself at depth 0, so a missing prompt returns no rows
+- With max_depth the walk stops after max_depth steps instead of reading the whole chain
+"""
+def get_prompt_chain(database_cursor, prompt_id, direction, max_depth=None):
+    return database_cursor.execute(
+        PROMPT_CHAIN_QUERY.format(step=CHAIN_DIRECTIONS[direction]),
+        {"prompt_id": prompt_id, "max_depth": max_depth}
+    ).fetchall()
+
+"""
+Build the response of the ancestors and descendants endpoints
+
+- The prompts are returned in chain order, so the ancestors start from the root prompt and the descendants start from the child prompt
+- Each prompt includes its depth, which is the number of steps from the requested prompt
+"""
+def make_prompt_chain_response(prompt_id, direction):
+    depth = request.args.get("depth")
+    if depth is not None and not (depth.isdigit() and int(depth) > 0):
+        return make_response(body=None, response_code=400, response_message="Depth must be a positive number")
+
+    database_connection = get_db(shard_router.get_prompt_database(prompt_id))
+    database_cursor = database_connection.cursor()
+    chain_rows = get_prompt_chain(database_cursor, prompt_id, direction, int(depth) if depth else None)
+    if not chain_rows:
+        return make_response(body=None, response_code=404, response_message="Prompt not found")
+
+    prompts = [
+        {
+            "id": row["prompt_id"],
+            "title": row["title"],
+            "description": row["description"],
+            "parentPromptId": row["parent_prompt_id"],
+            "projectId": row["project_id"],
+            "depth": row["depth"]
+        }
+        for row in chain_rows[1:]
+    ]
+    if direction == "ancestors":
+        prompts.reverse()
+    return make_response(body={"prompts": prompts}, response_code=200, response_message="Success")
+
+"""
+GET /prompts/:id/ancestors - returns the prompts before a prompt in the chain
+
+- The prompts are returned from the root prompt down to the parent prompt
+- With ?depth=N only the N nearest ancestors are returned
+"""
+@app.route("/prompts/<int:prompt_id>/ancestors", methods=["GET"])
+def get_prompt_ancestors(prompt_id):
+    try:
+        return make_prompt_chain_response(prompt_id, "ancestors")
+    except Exception as e:
+        print(f"Error fetching prompt ancestors: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
+"""
+GET /prompts/:id/descendants - returns the prompts after a prompt in the chain
+
+- The prompts are returned from the child prompt down to the last prompt of the chain
+- With ?depth=N only the N nearest descendants are returned
+"""
+@app.route("/prompts/<int:prompt_id>/descendants", methods=["GET"])
+def get_prompt_descendants(prompt_id):
+    try:
+        return make_prompt_chain_response(prompt_id, "descendants")
+    except Exception as e:
+        print(f"Error fetching prompt descendants: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
 """
 GET /prompts/:id/nodes - returns the nodes for a prompt
 
 - This includes a list of nodes associated with a particular prompt identified by its unique ID
 - The nodes contain details such as name and action
+- With ?limit=N the nodes are paginated by node ID and nextCursor is passed as ?after= to fetch the next page (null on the last page)
+- With ?stream=ndjson the nodes are streamed one per line instead of being wrapped in the response body
 """
 @app.route("/prompts/<int:prompt_id>/nodes", methods=["GET"])
 def get_prompt_nodes(prompt_id):
     try:
-        database_connection = get_db_connection()
+        try:
+            limit, after, stream = parse_page_args()
+            after_node_id = decode_node_cursor(after) if after is not None else 0
+        except ValueError as e:
+            return make_response(body=None, response_code=400, response_message=str(e))
+        database = shard_router.get_prompt_database(prompt_id)
+        database_connection = get_db(database)
         database_cursor = database_connection.cursor()
         response_code = 200
         response_message = "Success"
 
-        prompt_row = database_cursor.execute(
-            "SELECT * FROM PROMPTS WHERE prompt_id = ?",
-            (prompt_id,)
-        ).fetchone()
+        # The version and the nodes are read in one read transaction, so the nodes are the nodes of the version in the ETag
+        database_cursor.execute("BEGIN")
+        prompt_row = database_cursor.execute(PROMPT_VERSION_QUERY, (prompt_id,)).fetchone()
 
         if prompt_row:
-            node_rows = database_cursor.execute(
-                "SELECT * FROM NODES WHERE prompt_id = ? ORDER BY node_id",
-                (prompt_id,)
-            ).fetchall()
-            nodes = []
-            for row in node_rows:
-                node = {
-                    "name": row["name"],
-                    "action": row["action"],
+            etag = f"prompt-{prompt_id}-v{prompt_row['version']}-nodes"
+            if is_not_modified(etag):
+                return make_not_modified_response(etag)
+            # Only the full list of nodes is cached, pages and streams are always read from the database
+            cache_key = f"nodes:{prompt_id}" if limit is None and after is None and not stream else None
+            if cache_key:
+                cached_response = get_cached_response(cache_key, etag)
+                if cached_response is not None:
+                    return cached_response
+            # The JSON of the nodes is built by SQLite, so no Python object is created per node
+            query = NODES_PAGE_QUERY
+            params = (prompt_id, after_node_id)
+            if stream:
+                if limit is not None:
+                    query += " LIMIT ?"
+                    params += (limit,)
+                return set_etag(stream_ndjson(database, query, params), etag)
+
+            result = None
+            if limit is None:
+                # The whole list is aggregated into a single JSON array by SQLite
+                nodes_json = database_cursor.execute(NODES_LIST_QUERY, params).fetchone()[0]
+            else:
+                # One extra row is fetched to know whether there is a next page
+                node_cursor = database_connection.cursor()
+                node_cursor.row_factory = None
+                node_rows = node_cursor.execute(query + " LIMIT ?", params + (limit + 1,)).fetchall()
+                has_next_page = len(node_rows) > limit
+                node_rows = node_rows[:limit]
+                nodes_json = encode_array([row[1] for row in node_rows])
+                result = {
+                    "nextCursor": str(node_rows[-1][0]) if has_next_page else None
                 }
-                nodes.append(node)
-            result = {
-                "nodes": nodes
+            encoded_fields = {
+                "nodes": nodes_json
             }
         else:
             result = None
             response_code = 404
             response_message = "Prompt not found"
-        
-        database_connection.close()
-        return make_response(body=result, response_code=response_code, response_message=response_message)
+            return make_response(body=result, response_code=response_code, response_message=response_message)
+
+        response = make_encoded_response(encoded_fields, body=result, response_code=response_code, response_message=response_message, etag=etag)
+        return cache_response(cache_key, response, etag) if cache_key else response
     except Exception as e:
         print(f"Error fetching prompt nodes: {e}")
         return make_response(body=None, response_code=500, response_message="Internal Server Error")
@@ -165,7 +672,8 @@ def add_prompt(prompt_id):
         if not data or "title" not in data or not data["title"].strip() or "description" not in data or not data["description"].strip():
             return make_response(body=None, response_code=400, response_message="Title and description are required")
         
-        database_connection = get_db_connection()
+        database = shard_router.get_prompt_database(prompt_id)
+        database_connection = get_db(database)
         database_cursor = database_connection.cursor()
         response_code = 200
         response_message = "Prompt added successfully"
@@ -173,47 +681,115 @@ def add_prompt(prompt_id):
         parent_id = prompt_id if prompt_id > 0 else None
         project_id = None
         if parent_id is not None:
-            parent_row = database_cursor.execute(
-                "SELECT prompt_id, project_id FROM PROMPTS WHERE prompt_id = ?",
-                (parent_id,)
-            ).fetchone()
+            parent_row = database_cursor.execute(PROMPT_PROJECT_QUERY, (parent_id,)).fetchone()
             if not parent_row:
-                database_connection.close()
                 return make_response(body=None, response_code=404, response_message="Parent prompt not found")
             project_id = parent_row["project_id"]
         else:
             return make_response(body=None, response_code=400, response_message="Parent prompt ID must be greater than 0")
         
         # Check if parent prompt already has a child prompt
-        child_row = database_cursor.execute(
-            "SELECT prompt_id FROM PROMPTS WHERE parent_prompt_id = ?",
-            (parent_id,)
-        ).fetchone()
+        child_row = database_cursor.execute(CHILD_PROMPT_QUERY, (parent_id,)).fetchone()
         if child_row:
             result = None
             response_message = "Parent prompt already has a child prompt"
             response_code = 400
         else:
             # Insert new prompt
-            database_cursor.execute(
-                "INSERT INTO PROMPTS (title, description, parent_prompt_id, project_id) VALUES (?, ?, ?, ?)",
-                (data["title"], data["description"], parent_id, project_id)
-            )
-            new_prompt_row_id = database_cursor.lastrowid
-            new_prompt_id = database_cursor.execute(
-                "SELECT prompt_id FROM PROMPTS WHERE rowid = ?",
-                (new_prompt_row_id,)
-            ).fetchone()["prompt_id"]
-            result = {
-                "id": new_prompt_id
-            }
+            # The unique index on parent_prompt_id rejects the insert if another request added a child prompt concurrently
+            try:
+                database_cursor.execute(INSERT_PROMPT_QUERY, (data["title"], data["description"], parent_id, project_id))
+                result = {
+                    "id": database_cursor.lastrowid
+                }
+                database_cursor.execute(BUMP_PROJECT_VERSION_QUERY, (project_id,))
+                record_changes(database_cursor, "prompt", [result["id"]])
+            except sqlite3.IntegrityError:
+                result = None
+                response_message = "Parent prompt already has a child prompt"
+                response_code = 400
         database_connection.commit()
-        database_connection.close()
+        if result:
+            invalidate_tree_cache(project_id)
+            change_notifier.notify(database)
         return make_response(body=result, response_code=response_code, response_message=response_message)
     except Exception as e:
         print(f"Error adding prompt: {e}")
         return make_response(body=None, response_code=500, response_message="Internal Server Error")
 
+MAX_BATCH_SIZE = 1000
+
+"""
+Insert nodes for a prompt and return their new IDs in order
+
+- This is shared by the single and batch endpoints, and the caller commits the transaction
+- The versions are bumped once per call, so a batch invalidates the ETags only once
+- The node ID is an INTEGER PRIMARY KEY, which is an alias of the rowid, so lastrowid is the new node ID
+- The new nodes are recorded in the change log in the same transaction, and the caller notifies the event streams after the commit
+"""
+def insert_nodes(database_cursor, prompt_id, nodes):
+    node_ids = []
+    for node in nodes:
+        database_cursor.execute(INSERT_NODE_QUERY, (prompt_id, node["name"], node["action"]))
+        node_ids.append(database_cursor.lastrowid)
+    # Nodes are part of the expanded tree, so both the prompt and project versions change
+    database_cursor.execute(BUMP_PROMPT_VERSION_QUERY, (prompt_id,))
+    database_cursor.execute(BUMP_PROMPT_PROJECT_VERSION_QUERY, (prompt_id,))
+    record_changes(database_cursor, "node", node_ids)
+    return node_ids
+
+"""
+Insert notes for a prompt and return their new IDs in order
+
+- This is shared by the single and batch endpoints, and the caller commits the transaction
+- The new notes are recorded in the change log in the same transaction, and the caller notifies the event streams after the commit
+"""
+def insert_notes(database_cursor, prompt_id, notes):
+    note_ids = []
+    for note in notes:
+        database_cursor.execute(INSERT_NOTE_QUERY, (prompt_id, note["content"]))
+        note_ids.append(database_cursor.lastrowid)
+    database_cursor.execute(BUMP_PROMPT_VERSION_QUERY, (prompt_id,))
+    record_changes(database_cursor, "note", note_ids)
+    return note_ids
+
+"""
+Add nodes or notes to a prompt with insert_nodes or insert_notes, after checking that the prompt exists in the same transaction
+
+- This returns the project ID of the prompt and the new IDs, or None if the prompt doesn't exist
+"""
+def add_prompt_rows(database_cursor, prompt_id, insert_rows, rows):
+    prompt_row = database_cursor.execute(PROMPT_PROJECT_QUERY, (prompt_id,)).fetchone()
+    if not prompt_row:
+        return None
+    return prompt_row["project_id"], insert_rows(database_cursor, prompt_id, rows)
+
+"""
+Run a write with a cursor of a database, commit it and return its result
+
+- With WRITE_BEHIND=1 the write is queued and committed by the writer thread of the database in a batch with the writes of other requests,
+  and this waits until the batch is committed, so the response is still sent once the write is committed
+- Otherwise the write runs on the request's connection and is committed right away
+"""
+def run_write(database, write, *args):
+    if WRITE_BEHIND:
+        return get_write_queue(database).submit(write, *args).result()
+    database_connection = get_db(database)
+    result = write(database_connection.cursor(), *args)
+    database_connection.commit()
+    return result
+
+"""
+Check that the items of a batch request are objects with a non-empty string for every required field
+"""
+def is_valid_batch(items, required_fields):
+    if not isinstance(items, list) or not 1 <= len(items) <= MAX_BATCH_SIZE:
+        return False
+    return all(
+        isinstance(item, dict) and all(isinstance(item.get(field), str) and item[field].strip() for field in required_fields)
+        for item in items
+    )
+
 """
 POST /prompts/:id/nodes — add a node for a prompt
 
@@ -229,80 +805,121 @@ def add_prompt_node(prompt_id):
         data = request.json
         if not data or "name" not in data or not data["name"].strip() or "action" not in data or not data["action"].strip():
             return make_response(body=None, response_code=400, response_message="Name and action are required")
-        database_connection = get_db_connection()
-        database_cursor = database_connection.cursor()
-        response_code = 200
-        response_message = "Node added successfully"
-        prompt_row = database_cursor.execute(
-            "SELECT * FROM PROMPTS WHERE prompt_id = ?",
-            (prompt_id,)
-        ).fetchone()
-        if not prompt_row:
-            response_code = 404
-            response_message = "Prompt not found"
-            result = None
-        else:
-            # Insert new node
-            database_cursor.execute(
-                "INSERT INTO NODES (prompt_id, name, action) VALUES (?, ?, ?)",
-                (prompt_id, data["name"], data["action"])
-            )
-            new_node = database_cursor.execute(
-                "SELECT node_id FROM NODES WHERE prompt_id = ? AND name = ? ORDER BY rowid DESC LIMIT 1",
-                (prompt_id, data["name"])
-            ).fetchone()
-            new_node_id = new_node["node_id"]
-            result = {
-                "id": new_node_id
-            }
-        database_connection.commit()
-        database_connection.close()
-        return make_response(body=result, response_code=response_code, response_message=response_message)
+        database = shard_router.get_prompt_database(prompt_id)
+        # Insert new node
+        write_result = run_write(database, add_prompt_rows, prompt_id, insert_nodes, [data])
+        if not write_result:
+            return make_response(body=None, response_code=404, response_message="Prompt not found")
+
+        project_id, node_ids = write_result
+        invalidate_prompt_cache(prompt_id, project_id=project_id)
+        change_notifier.notify(database)
+        result = {
+            "id": node_ids[0]
+        }
+        return make_response(body=result, response_code=200, response_message="Node added successfully")
     except Exception as e:
         print(f"Error adding prompt node: {e}")
         return make_response(body=None, response_code=500, response_message="Internal Server Error")
 
+"""
+POST /prompts/:id/nodes/batch — add several nodes for a prompt
+
+- The request body should contain a "nodes" array (up to 1000 items), where every item has the name and action of a node
+- The whole batch is validated first and inserted in a single transaction, so either every node is added or none
+- If successful, the response will include the unique IDs of the newly created nodes in the order of the request
+- If the prompt ID does not exist, the request will be rejected
+"""
+@app.route("/prompts/<int:prompt_id>/nodes/batch", methods=["POST"])
+def add_prompt_nodes_batch(prompt_id):
+    try:
+        data = request.json
+        if not isinstance(data, dict) or not is_valid_batch(data.get("nodes"), ("name", "action")):
+            return make_response(body=None, response_code=400, response_message=f"Between 1 and {MAX_BATCH_SIZE} nodes with a name and action are required")
+
+        database = shard_router.get_prompt_database(prompt_id)
+        write_result = run_write(database, add_prompt_rows, prompt_id, insert_nodes, data["nodes"])
+        if not write_result:
+            return make_response(body=None, response_code=404, response_message="Prompt not found")
+
+        project_id, node_ids = write_result
+        invalidate_prompt_cache(prompt_id, project_id=project_id)
+        change_notifier.notify(database)
+        result = {
+            "ids": node_ids
+        }
+        return make_response(body=result, response_code=200, response_message="Nodes added successfully")
+    except Exception as e:
+        print(f"Error adding prompt nodes batch: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
 """
 GET /prompts/:id/notes — get notes for a prompt
 
 - This retrieves all notes associated with a particular prompt identified by its unique ID
-- The notes are returned in reverse chronological order based on their creation timestamp
+- The notes are returned in reverse chronological order based on their creation timestamp (newest note first for notes created in the same second)
+- With ?limit=N the notes are paginated by (creation timestamp, note ID) and nextCursor is passed as ?after= to fetch the next page (null on the last page)
+- With ?stream=ndjson the notes are streamed one per line instead of being wrapped in the response body
 """
 @app.route("/prompts/<int:prompt_id>/notes", methods=["GET"])
 def get_prompt_notes(prompt_id):
     try:
-        database_connection = get_db_connection()
+        try:
+            limit, after, stream = parse_page_args()
+            cursor_position = decode_note_cursor(after) if after is not None else None
+        except ValueError as e:
+            return make_response(body=None, response_code=400, response_message=str(e))
+
+        database = shard_router.get_prompt_database(prompt_id)
+        database_connection = get_db(database)
         database_cursor = database_connection.cursor()
         response_code = 200
         response_message = "Success"
 
-        prompt_row = database_cursor.execute(
-            "SELECT * FROM PROMPTS WHERE prompt_id = ?",
-            (prompt_id,)
-        ).fetchone()
+        prompt_row = database_cursor.execute(PROMPT_VERSION_QUERY, (prompt_id,)).fetchone()
 
         if prompt_row:
-            note_rows = database_cursor.execute(
-                "SELECT * FROM NOTES WHERE prompt_id = ? ORDER BY created_at DESC",
-                (prompt_id,)
-            ).fetchall()
-            notes = []
-            for row in note_rows:
-                note = {
-                    "content": row["content"],
-                    "createdAt": row["created_at"],
+            etag = f"prompt-{prompt_id}-v{prompt_row['version']}-notes"
+            if is_not_modified(etag):
+                return make_not_modified_response(etag)
+            # The JSON of the notes is built by SQLite, so no Python object is created per note
+            where = NOTES_WHERE
+            params = (prompt_id,)
+            if cursor_position is not None:
+                where = NOTES_AFTER_WHERE
+                params += cursor_position
+            query = NOTES_PAGE_QUERY.format(where=where)
+            if stream:
+                if limit is not None:
+                    query += " LIMIT ?"
+                    params += (limit,)
+                return set_etag(stream_ndjson(database, query, params), etag)
+
+            result = None
+            if limit is None:
+                # The whole list is aggregated into a single JSON array by SQLite
+                notes_json = database_cursor.execute(NOTES_LIST_QUERY.format(where=where), params).fetchone()[0]
+            else:
+                # One extra row is fetched to know whether there is a next page
+                note_cursor = database_connection.cursor()
+                note_cursor.row_factory = None
+                note_rows = note_cursor.execute(query + " LIMIT ?", params + (limit + 1,)).fetchall()
+                has_next_page = len(note_rows) > limit
+                note_rows = note_rows[:limit]
+                notes_json = encode_array([row[2] for row in note_rows])
+                result = {
+                    "nextCursor": encode_note_cursor(note_rows[-1][1], note_rows[-1][0]) if has_next_page else None
                 }
-                notes.append(note)
-            result = {
-                "notes": notes
+            encoded_fields = {
+                "notes": notes_json
             }
         else:
             result = None
             response_code = 404
             response_message = "Prompt not found"
-        
-        database_connection.close()
-        return make_response(body=result, response_code=response_code, response_message=response_message)
+            return make_response(body=result, response_code=response_code, response_message=response_message)
+
+        return make_encoded_response(encoded_fields, body=result, response_code=response_code, response_message=response_message, etag=etag)
     except Exception as e:
         print(f"Error fetching prompt notes: {e}")
         return make_response(body=None, response_code=500, response_message="Internal Server Error")
@@ -323,44 +940,368 @@ def add_prompt_note(prompt_id):
         if not data or "content" not in data or not data["content"].strip():
             return make_response(body=None, response_code=400, response_message="Content is required")
 
-        database_connection = get_db_connection()
-        database_cursor = database_connection.cursor()
-        response_code = 200
-        response_message = "Note added successfully"
+        database = shard_router.get_prompt_database(prompt_id)
+        # Insert new note
+        write_result = run_write(database, add_prompt_rows, prompt_id, insert_notes, [data])
+        if not write_result:
+            return make_response(body=None, response_code=404, response_message="Prompt not found")
+
+        project_id, note_ids = write_result
+        invalidate_prompt_cache(prompt_id)
+        change_notifier.notify(database)
+        result = {
+            "id": note_ids[0]
+        }
+        return make_response(body=result, response_code=200, response_message="Note added successfully")
+    except Exception as e:
+        print(f"Error adding prompt note: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
+"""
+POST /prompts/:id/notes/batch — add several notes for a prompt
+
+- The request body should contain a "notes" array (up to 1000 items), where every item has the content of a note
+- The whole batch is validated first and inserted in a single transaction, so either every note is added or none
+- If successful, the response will include the unique IDs of the newly created notes in the order of the request
+- If the prompt ID does not exist, the request will be rejected
+"""
+@app.route("/prompts/<int:prompt_id>/notes/batch", methods=["POST"])
+def add_prompt_notes_batch(prompt_id):
+    try:
+        data = request.json
+        if not isinstance(data, dict) or not is_valid_batch(data.get("notes"), ("content",)):
+            return make_response(body=None, response_code=400, response_message=f"Between 1 and {MAX_BATCH_SIZE} notes with content are required")
 
-        prompt_row = database_cursor.execute(
-            "SELECT * FROM PROMPTS WHERE prompt_id = ?",
-            (prompt_id,)
-        ).fetchone()
+        database = shard_router.get_prompt_database(prompt_id)
+        write_result = run_write(database, add_prompt_rows, prompt_id, insert_notes, data["notes"])
+        if not write_result:
+            return make_response(body=None, response_code=404, response_message="Prompt not found")
+
+        project_id, note_ids = write_result
+        invalidate_prompt_cache(prompt_id)
+        change_notifier.notify(database)
+        result = {
+            "ids": note_ids
+        }
+        return make_response(body=result, response_code=200, response_message="Notes added successfully")
+    except Exception as e:
+        print(f"Error adding prompt notes batch: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
+"""
+Parse the position a change stream resumes from, which is the ID of the last event the client received
+
+- Browsers send it as the Last-Event-ID header when they reconnect, and ?lastEventId= sets it for the first connection
+- Without either, the stream starts at the last change of the database, so only the changes made after it are sent
+- A ValueError is raised for invalid values, which the handlers report as a 400 response
+"""
+def parse_last_event_id():
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    if last_event_id is None:
+        return None
+    if not last_event_id.isdigit():
+        raise ValueError("Last event ID must be a change ID")
+    return int(last_event_id)
+
+"""
+GET /prompts/:id/events — stream the nodes and notes added to a prompt
 
+- This is a Server-Sent Events stream, where every new node or note is sent as a node or note event with the JSON of the new row
+- The id of every event is its change ID, so a client that reconnects with Last-Event-ID receives only the changes it missed
+- If the prompt ID does not exist, the response is the usual JSON envelope with a 404 code instead of a stream
+"""
+@app.route("/prompts/<int:prompt_id>/events", methods=["GET"])
+def get_prompt_events(prompt_id):
+    try:
+        try:
+            last_event_id = parse_last_event_id()
+        except ValueError as e:
+            return make_response(body=None, response_code=400, response_message=str(e))
+
+        database = shard_router.get_prompt_database(prompt_id)
+        database_cursor = get_db(database).cursor()
+        prompt_row = database_cursor.execute(PROMPT_EXISTS_QUERY, (prompt_id,)).fetchone()
         if not prompt_row:
-            response_code = 404
-            response_message = "Prompt not found"
-            result = None
+            return make_response(body=None, response_code=404, response_message="Prompt not found")
+        if last_event_id is None:
+            last_event_id = get_last_change_id(database_cursor)
+        return stream_changes(database, "prompt_id", prompt_id, last_event_id)
+    except Exception as e:
+        print(f"Error streaming prompt events: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
+"""
+GET /projects/:id/events — stream the prompts, nodes and notes added to a project
+
+- This is the same Server-Sent Events stream as for a prompt, for every prompt of the project, and new prompts are sent as prompt events
+"""
+@app.route("/projects/<int:project_id>/events", methods=["GET"])
+def get_project_events(project_id):
+    try:
+        try:
+            last_event_id = parse_last_event_id()
+        except ValueError as e:
+            return make_response(body=None, response_code=400, response_message=str(e))
+
+        database = shard_router.get_project_database(project_id)
+        database_cursor = get_db(database).cursor()
+        project_row = database_cursor.execute(PROJECT_EXISTS_QUERY, (project_id,)).fetchone()
+        if not project_row:
+            return make_response(body=None, response_code=404, response_message="Project not found")
+        if last_event_id is None:
+            last_event_id = get_last_change_id(database_cursor)
+        return stream_changes(database, "project_id", project_id, last_event_id)
+    except Exception as e:
+        print(f"Error streaming project events: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
+MAX_SEARCH_LIMIT = 100
+
+"""
+Build an FTS5 query from the search text entered by a user
+
+- Every word is quoted, so the FTS5 query syntax (operators, column filters) in the text can't make the query fail
+- The words are combined with AND and every word is matched as a prefix, so results show up while typing and for partial words
+"""
+def build_search_query(text):
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+"""
+GET /search?q= — full-text search across prompts, nodes and notes
+
+- The prompts are searched by title and description, the nodes by name and action and the notes by content
+- The results are ranked with bm25 (lower scores are better matches) and include a snippet with the matches highlighted in <mark> tags
+- Every result has its type (prompt, node or note), its ID and the ID of the prompt it belongs to
+- ?limit=N (up to 100, defaults to 20) and ?offset=N paginate the results, and nextOffset is the offset of the next page (null on the last page)
+- Each FTS table only returns its best offset + limit matches, which keeps the search fast on large tables
+- The projects stored in their own database files are searched too, and the best matches of every database are merged by score
+"""
+@app.route("/search", methods=["GET"])
+def search():
+    try:
+        search_query = build_search_query(request.args.get("q", ""))
+        if search_query is None:
+            return make_response(body=None, response_code=400, response_message="Search text is required")
+        limit = request.args.get("limit", "20")
+        offset = request.args.get("offset", "0")
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_SEARCH_LIMIT or not offset.isdigit():
+            return make_response(body=None, response_code=400, response_message=f"Limit must be between 1 and {MAX_SEARCH_LIMIT} and offset must be a positive number")
+        limit = int(limit)
+        offset = int(offset)
+
+        # One extra row is fetched to know whether there is a next page
+        candidate_count = offset + limit + 1
+        result_rows = []
+        for database in shard_router.get_databases():
+            database_cursor = get_db(database).cursor()
+            result_rows.extend(database_cursor.execute(
+                SEARCH_QUERY,
+                (search_query, candidate_count, search_query, candidate_count, search_query, candidate_count, candidate_count)
+            ).fetchall())
+        result_rows.sort(key=lambda row: row["score"])
+        result_rows = result_rows[offset:candidate_count]
+
+        results = []
+        for row in result_rows[:limit]:
+            results.append({
+                "type": row["type"],
+                "id": row["id"],
+                "promptId": row["prompt_id"],
+                "snippet": row["snippet"],
+                "score": row["score"],
+            })
+        result = {
+            "results": results,
+            "nextOffset": offset + limit if len(result_rows) > limit else None
+        }
+        return make_response(body=result, response_code=200, response_message="Success")
+    except Exception as e:
+        print(f"Error searching: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
+"""
+POST /import — bulk import a prompt list file as a new project
+
+- The request body is a prompt list in the prompt_list.json shape, which is read incrementally from the request stream
+- The prompts and nodes are inserted in batches in a single transaction, so a failed import leaves the database unchanged
+- With DB_SHARDING=project the project is created in its own database file
+- ?deferIndexes=true drops the secondary indexes during the import and rebuilds them at the end, and ?batchSize=N sets the number of rows per batch
+- If successful, the response will include the ID of the new project, the number of imported prompts and nodes and the rows imported per second
+"""
+@app.route("/import", methods=["POST"])
+def import_prompts():
+    try:
+        batch_size = request.args.get("batchSize", str(BATCH_SIZE))
+        if not batch_size.isdigit() or int(batch_size) < 1:
+            return make_response(body=None, response_code=400, response_message="Batch size must be a positive number")
+        defer_indexes = request.args.get("deferIndexes", "false").lower() == "true"
+
+        text_stream = io.TextIOWrapper(request.stream, encoding="utf-8")
+        try:
+            # With sharding the new project is created in its own database file
+            if shard_router.sharding:
+                result = shard_router.import_prompt_list(text_stream, batch_size=int(batch_size), defer_indexes=defer_indexes)
+            else:
+                result = import_prompt_list(get_db(), text_stream, batch_size=int(batch_size), defer_indexes=defer_indexes)
+        except (ValueError, sqlite3.IntegrityError) as e:
+            return make_response(body=None, response_code=400, response_message=f"Invalid prompt list: {e}")
+        return make_response(body=result, response_code=200, response_message="Prompt list imported successfully")
+    except Exception as e:
+        print(f"Error importing prompt list: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
+EXPORT_FORMATS = ("ndjson", "prompt_list")
+# The export text is encoded (and compressed) in chunks of about this many characters
+EXPORT_CHUNK_SIZE = 65536
+EXPORT_COMPRESSION_LEVEL = 6
+
+"""
+Generate the text of a project export in chunks of about EXPORT_CHUNK_SIZE characters
+
+- The export reads the project in a single read transaction, so it is a consistent snapshot even while the project is written to,
+  and in WAL mode it doesn't block the writers
+- The prompts are read in chain order in batches, and the nodes and notes of every prompt are read with the indexes on prompt_id,
+  so memory stays flat regardless of the size of the project
+- The export uses a connection of the stream pool, as it keeps running after the request's connection is returned to the pool
+  and holds its connection and read transaction until the client has downloaded the whole export
+"""
+def generate_project_export(database, project_id, export_format):
+    queries = EXPORT_QUERIES[export_format]
+    pool = get_stream_pool(database)
+    database_connection = pool.acquire()
+    try:
+        database_connection.execute("BEGIN")
+        database_cursor = database_connection.cursor()
+        database_cursor.row_factory = None
+        row_cursor = database_connection.cursor()
+        row_cursor.row_factory = None
+        project_json = database_cursor.execute(queries["project"], (project_id,)).fetchone()[0]
+        if export_format == "ndjson":
+            parts = [project_json, "\n"]
         else:
-            # Insert new note
-            database_cursor.execute(
-                "INSERT INTO NOTES (prompt_id, content) VALUES (?, ?)",
-                (prompt_id, data["content"])
-            )
-            new_note = database_cursor.execute(
-                "SELECT note_id FROM NOTES WHERE prompt_id = ? AND content = ? ORDER BY rowid DESC LIMIT 1",
-                (prompt_id, data["content"])
-            ).fetchone()
-            new_note_id = new_note["note_id"]
-            result = {
-                "id": new_note_id
-            }
-        database_connection.commit()
-        database_connection.close()
-        return make_response(body=result, response_code=response_code, response_message=response_message)
+            # The prompts array is written after the other keys of the project, one prompt at a time
+            parts = [project_json[:-1], ',"prompts":[']
+        size = sum(len(part) for part in parts)
+        first_prompt = True
+        query_chain_prompts(database_cursor, project_id, queries["prompt"])
+        while True:
+            prompt_rows = database_cursor.fetchmany(STREAM_BATCH_SIZE)
+            if not prompt_rows:
+                break
+            for prompt_id, prompt_json in prompt_rows:
+                if export_format == "ndjson":
+                    parts.append(prompt_json + "\n")
+                    size += len(prompt_json) + 1
+                    for row_query in (queries["nodes"], queries["notes"]):
+                        row_cursor.execute(row_query, (prompt_id,))
+                        while True:
+                            rows = row_cursor.fetchmany(STREAM_BATCH_SIZE)
+                            if not rows:
+                                break
+                            for row in rows:
+                                parts.append(row[0] + "\n")
+                                size += len(row[0]) + 1
+                            if size >= EXPORT_CHUNK_SIZE:
+                                yield "".join(parts)
+                                parts = []
+                                size = 0
+                else:
+                    parts.append(prompt_json if first_prompt else "," + prompt_json)
+                    size += len(prompt_json) + 1
+                    first_prompt = False
+                if size >= EXPORT_CHUNK_SIZE:
+                    yield "".join(parts)
+                    parts = []
+                    size = 0
+        if export_format == "prompt_list":
+            parts.append("]}")
+        yield "".join(parts)
+    finally:
+        pool.release(database_connection)
+
+"""
+Compress text chunks into a gzip stream
+"""
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(EXPORT_COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+"""
+GET /projects/:id/export — export a whole project
+
+- ?format=ndjson (default) streams one line of JSON per row: the project, then every prompt in chain order followed by its nodes and notes, each with its type
+- ?format=prompt_list streams the project in the prompt_list.json shape, with the notes of every prompt, which POST /import can import again (without the notes)
+- The export is compressed with gzip (Content-Encoding: gzip) when the request accepts it
+- The export is streamed as it is read from the database, and is a consistent snapshot of the project
+"""
+@app.route("/projects/<int:project_id>/export", methods=["GET"])
+def export_project(project_id):
+    try:
+        export_format = request.args.get("format", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            return make_response(body=None, response_code=400, response_message=f"Format must be one of {', '.join(EXPORT_FORMATS)}")
+
+        database = shard_router.get_project_database(project_id)
+        project_row = get_db(database).execute(PROJECT_EXISTS_QUERY, (project_id,)).fetchone()
+        if not project_row:
+            return make_response(body=None, response_code=404, response_message="Project not found")
+
+        chunks = generate_project_export(database, project_id, export_format)
+        if export_format == "ndjson":
+            response = Response(mimetype="application/x-ndjson")
+            filename = f"project-{project_id}.ndjson"
+        else:
+            response = Response(mimetype="application/json")
+            filename = f"project-{project_id}.json"
+        if request.accept_encodings["gzip"]:
+            response.response = gzip_chunks(chunks)
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response.response = chunks
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
     except Exception as e:
-        print(f"Error adding prompt note: {e}")
+        print(f"Error exporting project: {e}")
+        return make_response(body=None, response_code=500, response_message="Internal Server Error")
+
+# The admin endpoints require the ADMIN_TOKEN bearer token, and are disabled when ADMIN_TOKEN is not set
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+def is_admin_request():
+    if not ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {ADMIN_TOKEN}")
+
+"""
+POST /admin/snapshot — snapshot every database
+
+- The main database and the databases of the sharded projects are copied with SQLite's online backup API into a new directory of SNAPSHOT_DIRECTORY,
+  which never blocks the writers
+- The request must have the Authorization: Bearer <ADMIN_TOKEN> header
+- If successful, the response will include the snapshot directory and the file, size and duration of every database snapshot
+"""
+@app.route("/admin/snapshot", methods=["POST"])
+def create_snapshot():
+    try:
+        if not is_admin_request():
+            return make_response(body=None, response_code=403, response_message="Admin token required")
+        result = snapshot_databases(shard_router.get_databases(), get_snapshot_directory(DATABASE))
+        return make_response(body=result, response_code=200, response_message="Snapshot created successfully")
+    except Exception as e:
+        print(f"Error creating snapshot: {e}")
         return make_response(body=None, response_code=500, response_message="Internal Server Error")
 
 if __name__ == "__main__":
-    # This will create the database file and tables if they don't exist
-    # It will also seed the database from the provided JSON file
+    # This will create the database file and migrate the schema to the latest version
+    # It will also import the provided JSON file, which is skipped if the file didn't change since the last start
     init_db()
     port = int(os.environ.get("PORT", "5001"))
     app.run(debug=True, host="127.0.0.1", port=port)
\ No newline at end of file
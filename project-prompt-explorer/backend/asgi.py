@@ -0,0 +1,163 @@
+import asyncio
+import contextvars
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+from connection_pool import POOL_SIZE, close_pools
+from write_queue import close_write_queues
+
+# The executor runs the route handlers and their database work, and is sized to the connection pool
+# as a handler never holds more than one connection
+DATABASE_EXECUTOR_SIZE = int(os.environ.get("ASGI_DATABASE_THREADS", str(POOL_SIZE)))
+# Event streams wait for new changes between their chunks, so their chunks are read on a separate executor and an open stream
+# never takes a thread of the database executor (a stream only checks out a connection while it reads the change log)
+EVENT_STREAM_EXECUTOR_SIZE = int(os.environ.get("ASGI_EVENT_STREAM_THREADS", "64"))
+# Request bodies larger than this are spooled to a temporary file instead of being kept in memory
+MAX_BODY_IN_MEMORY = 1024 * 1024
+# Routes whose handlers never block, which run on the event loop so they are answered even when every executor thread is busy
+EVENT_LOOP_PATHS = {"/healthz"}
+
+database_executor = ThreadPoolExecutor(max_workers=DATABASE_EXECUTOR_SIZE, thread_name_prefix="database")
+event_stream_executor = ThreadPoolExecutor(max_workers=EVENT_STREAM_EXECUTOR_SIZE, thread_name_prefix="event_stream")
+
+"""
+Read the whole request body from the ASGI receive channel without blocking the event loop
+"""
+async def read_body(receive):
+    body = tempfile.SpooledTemporaryFile(max_size=MAX_BODY_IN_MEMORY)
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body.write(message.get("body", b""))
+        if not message.get("more_body", False):
+            body.seek(0)
+            return body
+
+"""
+Wait until the client disconnects, which is the only message left on the receive channel once the request body is read
+"""
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+"""
+Build the WSGI environ of the Flask app from an ASGI HTTP scope
+"""
+def build_environ(scope, body):
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.input_terminated": True,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    # The body is fully read, so its length is known even for chunked requests
+    body.seek(0, os.SEEK_END)
+    environ["CONTENT_LENGTH"] = str(body.tell())
+    body.seek(0)
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+        elif name != "CONTENT_LENGTH":
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+"""
+Run a Flask route handler and return its status, headers and response body iterator
+
+- This runs on the database executor, as the handlers do blocking SQLite calls
+"""
+def run_handler(environ):
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = int(status.split(" ", 1)[0])
+        started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+    body_iterable = app.wsgi_app(environ, start_response)
+    body_iterator = iter(body_iterable)
+    # Reading the first chunk runs the handler for streamed responses, and returns the whole body for the other responses
+    first_chunk = next(body_iterator, None)
+    return started["status"], started["headers"], first_chunk, body_iterable, body_iterator
+
+"""
+ASGI entry point exposing the same routes and JSON envelope as the Flask app
+
+- Reading the request and sending the response are done on the event loop, so slow clients don't hold a thread
+- The route handlers and their database work run on a dedicated executor, bounded by the size of the connection pool,
+  except for the handlers of EVENT_LOOP_PATHS which don't block
+- Streamed responses are read from the handler one chunk at a time on the executor and sent as they are produced
+- Event streams are read on their own executor, and are closed when the client disconnects
+- The handler and every chunk of its response run in the same copy of the context, whichever thread runs them, as executors don't carry
+  context variables over, so the SQL metrics of a streamed response are recorded under its route
+"""
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                event_stream_executor.shutdown(wait=False, cancel_futures=True)
+                database_executor.shutdown(wait=True)
+                close_write_queues()
+                close_pools()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    if scope["type"] != "http":
+        return
+
+    body = await read_body(receive)
+    if body is None:
+        return
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    try:
+        if scope["path"] in EVENT_LOOP_PATHS:
+            status, headers, chunk, body_iterable, body_iterator = context.run(run_handler, build_environ(scope, body))
+        else:
+            status, headers, chunk, body_iterable, body_iterator = await loop.run_in_executor(
+                database_executor, context.run, run_handler, build_environ(scope, body)
+            )
+        is_event_stream = any(
+            name == b"content-type" and value.startswith(b"text/event-stream") for name, value in headers
+        )
+        chunk_executor = event_stream_executor if is_event_stream else database_executor
+        # Servers can drop the chunks sent after a disconnect without an error, so an event stream, which never ends, watches for it
+        disconnect_task = asyncio.create_task(wait_for_disconnect(receive)) if is_event_stream else None
+        try:
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            while chunk is not None:
+                if disconnect_task is not None and disconnect_task.done():
+                    break
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(chunk_executor, context.run, next, body_iterator, None)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if disconnect_task is not None:
+                disconnect_task.cancel()
+            # Closing the iterable ends the request context, which returns the database connection to the pool
+            if hasattr(body_iterable, "close"):
+                await loop.run_in_executor(database_executor, context.run, body_iterable.close)
+    finally:
+        body.close()
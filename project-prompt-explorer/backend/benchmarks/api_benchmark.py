@@ -0,0 +1,400 @@
+import argparse
+import datetime
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import re
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from synthetic_datasets import SCALES, WORDS, generate_dataset
+
+BACKEND_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+"""
+Load test of every API route, which measures the requests per second and the latency percentiles of each route
+
+- For every scale, a synthetic dataset is generated and loaded into a fresh database served by a local server
+  (or into the server given with --url), through POST /import and the notes batch endpoint
+- Every route is then driven by a number of concurrent clients, each with its own keep-alive connection,
+  and each concurrency level runs the read routes first and the write routes last
+- The dataset and the requests are generated from seeded random generators, so runs with the same settings send the same requests
+- The results are written as JSON and can be compared against the results of a previous run with --baseline
+"""
+
+DEFAULT_REQUESTS = 200
+DEFAULT_WARMUP = 20
+DEFAULT_THRESHOLD = 0.1
+SERVER_START_TIMEOUT = 30
+RESPONSE_CODE = re.compile(rb'^\{"responseCode":(\d+)')
+
+"""
+Serve the app on a fresh database, which is run by the benchmark in a separate process
+
+- The schema is migrated but the sample prompt list is not seeded, so the database only has the benchmark dataset
+- The server is threaded and keeps connections alive, and the request log is disabled so it doesn't slow the server down
+"""
+def serve(database, port):
+    sys.path.insert(0, BACKEND_DIRECTORY)
+    import init_db
+    init_db.DATABASE = database
+    database_connection = init_db.get_db_connection()
+    init_db.migrate_db(database_connection)
+    database_connection.close()
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from app import app
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    make_server("127.0.0.1", port, app, threaded=True).serve_forever()
+
+def get_free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(database):
+    port = get_free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "serve", "--database", database, "--port", str(port)],
+        cwd=BACKEND_DIRECTORY
+    )
+    started_at = time.monotonic()
+    while time.monotonic() - started_at < SERVER_START_TIMEOUT:
+        if server.poll() is not None:
+            raise RuntimeError("The benchmark server exited during startup")
+        try:
+            BenchmarkClient("127.0.0.1", port).request("GET", "/projects")
+            return server, port
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError(f"The benchmark server didn't start in {SERVER_START_TIMEOUT} seconds")
+
+"""
+HTTP client with a keep-alive connection, which is reopened after a connection error
+"""
+class BenchmarkClient:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        try:
+            self.connection.request(method, path, body=body, headers=headers or {})
+            response = self.connection.getresponse()
+            return response.status, response.getheader("ETag"), response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.connection = None
+            raise
+
+    def request_json(self, method, path, body=None):
+        _, _, data = self.request(method, path, json.dumps(body) if body is not None else None, {"Content-Type": "application/json"})
+        return json.loads(data)
+
+"""
+Check the status and the responseCode of the envelope, as the API returns errors with a 200 status
+"""
+def is_success(status, data):
+    if status == 304:
+        return True
+    if status != 200:
+        return False
+    match = RESPONSE_CODE.match(data)
+    return match is None or int(match.group(1)) < 400
+
+"""
+Load a dataset through the API and collect the IDs used by the routes
+
+- Every concurrent client gets its own one-prompt project, to which it appends prompts, as only the last prompt of a chain can get a child
+- The ETag of the root of the first of these projects is used by the conditional request, as no route writes to that prompt
+"""
+def load_dataset(client, dataset, client_count, seed):
+    project = client.request_json("POST", "/import", dataset)
+    project_id = project["projectId"]
+    prompt_ids = client.request_json("GET", f"/projects/{project_id}/tree")["prompts"]
+    for prompt_id, prompt in zip(prompt_ids, dataset["prompts"]):
+        notes = [{"content": content} for content in prompt["notes"]]
+        for start in range(0, len(notes), 1000):
+            client.request_json("POST", f"/prompts/{prompt_id}/notes/batch", {"notes": notes[start:start + 1000]})
+
+    tail_prompt_ids = []
+    for index in range(client_count):
+        chain = client.request_json("POST", "/import", {"project": f"Benchmark chain {index + 1}", "prompts": [{"title": "Chain root"}]})
+        tail_prompt_ids.append(client.request_json("GET", f"/projects/{chain['projectId']}/tree")["prompts"][0])
+    _, etag, _ = client.request("GET", f"/prompts/{tail_prompt_ids[0]}")
+
+    return {
+        "projectId": project_id,
+        "promptIds": prompt_ids,
+        "tailPromptIds": tail_prompt_ids,
+        "etagPromptId": tail_prompt_ids[0],
+        "etag": etag,
+        "importBody": json.dumps(generate_dataset(10, 5, 0, seed=seed, name="Benchmark import")),
+    }
+
+def json_body(value):
+    return json.dumps(value), {"Content-Type": "application/json"}
+
+def random_prompt(context, rng):
+    return rng.choice(context["promptIds"])
+
+def build_add_prompt(context, rng, client_index):
+    body, headers = json_body({"title": "Benchmark prompt", "description": " ".join(rng.choices(WORDS, k=10))})
+    return f"/prompts/{context['tailPromptIds'][client_index]}", body, headers
+
+def on_add_prompt(context, client_index, data):
+    context["tailPromptIds"][client_index] = json.loads(data)["id"]
+
+# Routes as (name, method, build, on_success)
+# - build returns the path, body and headers of a request from the dataset context, the client's random generator and the client index
+# - on_success is called with the response of a successful request, for the routes that depend on the previous response
+READ_ROUTES = [
+    ("GET /tree", "GET", lambda context, rng, client_index: ("/tree", None, None), None),
+    ("GET /tree?expand=prompts,nodes", "GET", lambda context, rng, client_index: ("/tree?expand=prompts,nodes", None, None), None),
+    ("GET /projects", "GET", lambda context, rng, client_index: ("/projects", None, None), None),
+    ("GET /projects/:id/tree", "GET", lambda context, rng, client_index: (f"/projects/{context['projectId']}/tree", None, None), None),
+    ("GET /prompts/:id", "GET", lambda context, rng, client_index: (f"/prompts/{random_prompt(context, rng)}", None, None), None),
+    (
+        "GET /prompts/:id (If-None-Match)", "GET",
+        lambda context, rng, client_index: (f"/prompts/{context['etagPromptId']}", None, {"If-None-Match": context["etag"]}),
+        None
+    ),
+    ("GET /prompts/:id/nodes", "GET", lambda context, rng, client_index: (f"/prompts/{random_prompt(context, rng)}/nodes", None, None), None),
+    ("GET /prompts/:id/nodes?limit=10", "GET", lambda context, rng, client_index: (f"/prompts/{random_prompt(context, rng)}/nodes?limit=10", None, None), None),
+    ("GET /prompts/:id/nodes?stream=ndjson", "GET", lambda context, rng, client_index: (f"/prompts/{random_prompt(context, rng)}/nodes?stream=ndjson", None, None), None),
+    ("GET /prompts/:id/notes", "GET", lambda context, rng, client_index: (f"/prompts/{random_prompt(context, rng)}/notes", None, None), None),
+    ("GET /prompts/:id/notes?limit=10", "GET", lambda context, rng, client_index: (f"/prompts/{random_prompt(context, rng)}/notes?limit=10", None, None), None),
+    ("GET /prompts/:id/ancestors?depth=10", "GET", lambda context, rng, client_index: (f"/prompts/{random_prompt(context, rng)}/ancestors?depth=10", None, None), None),
+    ("GET /prompts/:id/descendants?depth=10", "GET", lambda context, rng, client_index: (f"/prompts/{random_prompt(context, rng)}/descendants?depth=10", None, None), None),
+    ("GET /search", "GET", lambda context, rng, client_index: (f"/search?q={'+'.join(rng.choices(WORDS, k=2))}", None, None), None),
+    ("GET /cache/stats", "GET", lambda context, rng, client_index: ("/cache/stats", None, None), None),
+    (
+        "GET /projects/:id/export (gzip)", "GET",
+        lambda context, rng, client_index: (f"/projects/{context['projectId']}/export", None, {"Accept-Encoding": "gzip"}),
+        None
+    ),
+]
+WRITE_ROUTES = [
+    ("POST /prompts/:id", "POST", build_add_prompt, on_add_prompt),
+    (
+        "POST /prompts/:id/nodes", "POST",
+        lambda context, rng, client_index: (f"/prompts/{random_prompt(context, rng)}/nodes", *json_body({"name": "Benchmark node", "action": " ".join(rng.choices(WORDS, k=10))})),
+        None
+    ),
+    (
+        "POST /prompts/:id/nodes/batch", "POST",
+        lambda context, rng, client_index: (
+            f"/prompts/{random_prompt(context, rng)}/nodes/batch",
+            *json_body({"nodes": [{"name": "Benchmark node", "action": " ".join(rng.choices(WORDS, k=10))} for _ in range(10)]})
+        ),
+        None
+    ),
+    (
+        "POST /prompts/:id/notes", "POST",
+        lambda context, rng, client_index: (f"/prompts/{random_prompt(context, rng)}/notes", *json_body({"content": " ".join(rng.choices(WORDS, k=10))})),
+        None
+    ),
+    (
+        "POST /prompts/:id/notes/batch", "POST",
+        lambda context, rng, client_index: (
+            f"/prompts/{random_prompt(context, rng)}/notes/batch",
+            *json_body({"notes": [{"content": " ".join(rng.choices(WORDS, k=10))} for _ in range(10)]})
+        ),
+        None
+    ),
+    ("POST /import", "POST", lambda context, rng, client_index: ("/import", context["importBody"], {"Content-Type": "application/json"}), None),
+]
+
+def run_client(host, port, route, context, client_index, request_count, seed):
+    _, method, build, on_success = route
+    rng = random.Random(f"{seed}-{route[0]}-{client_index}")
+    client = BenchmarkClient(host, port)
+    latencies = []
+    errors = 0
+    for _ in range(request_count):
+        path, body, headers = build(context, rng, client_index)
+        started_at = time.perf_counter()
+        try:
+            status, _, data = client.request(method, path, body, headers)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started_at)
+        if not is_success(status, data):
+            errors += 1
+        elif on_success:
+            on_success(context, client_index, data)
+    return latencies, errors
+
+"""
+Get a percentile of sorted latencies with the nearest-rank method
+"""
+def get_percentile(sorted_latencies, percentile):
+    if not sorted_latencies:
+        return None
+    rank = max(1, round(percentile / 100 * len(sorted_latencies)))
+    return sorted_latencies[rank - 1]
+
+"""
+Run the requests of a route split across concurrent clients, and measure the throughput and latency percentiles
+"""
+def run_route(host, port, route, context, concurrency, request_count, seed):
+    requests_per_client = [request_count // concurrency + (1 if index < request_count % concurrency else 0) for index in range(concurrency)]
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(
+            lambda client_index: run_client(host, port, route, context, client_index, requests_per_client[client_index], seed),
+            range(concurrency)
+        ))
+    seconds = time.perf_counter() - started_at
+
+    latencies = sorted(latency for client_latencies, _ in outcomes for latency in client_latencies)
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "route": route[0],
+        "concurrency": concurrency,
+        "requests": request_count,
+        "errors": sum(errors for _, errors in outcomes),
+        "seconds": round(seconds, 3),
+        "requestsPerSecond": round(len(latencies) / seconds, 1) if seconds > 0 else None,
+        "p50Ms": to_ms(get_percentile(latencies, 50)),
+        "p95Ms": to_ms(get_percentile(latencies, 95)),
+        "p99Ms": to_ms(get_percentile(latencies, 99)),
+        "meanMs": to_ms(sum(latencies) / len(latencies) if latencies else None),
+        "maxMs": to_ms(latencies[-1] if latencies else None),
+    }
+
+def run_scale(host, port, scale, arguments, routes):
+    chain_length, nodes_per_prompt, notes_per_prompt = SCALES[scale]
+    print(f"\nScale {scale}: {chain_length} prompts, {nodes_per_prompt} nodes and {notes_per_prompt} notes per prompt")
+    dataset = generate_dataset(chain_length, nodes_per_prompt, notes_per_prompt, seed=arguments.seed, name=f"Benchmark {scale}")
+    context = load_dataset(BenchmarkClient(host, port), dataset, max(arguments.concurrency), arguments.seed)
+
+    results = []
+    for concurrency in arguments.concurrency:
+        print(f"  Concurrency {concurrency}")
+        for route in routes:
+            if arguments.warmup:
+                run_route(host, port, route, context, concurrency, arguments.warmup, arguments.seed)
+            result = run_route(host, port, route, context, concurrency, arguments.requests, arguments.seed)
+            result["scale"] = scale
+            results.append(result)
+            print(
+                f"    {result['route']:<42} {result['requestsPerSecond']:>9} req/s  p50 {result['p50Ms']:>8} ms"
+                f"  p95 {result['p95Ms']:>8} ms  p99 {result['p99Ms']:>8} ms  errors {result['errors']}"
+            )
+    return results
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIRECTORY, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+"""
+Compare results with the results of a baseline run, for the same scale, concurrency and route
+
+- A route regressed when its p95 latency grew, or its requests per second dropped, by more than the threshold (a fraction)
+- Returns the descriptions of the regressions
+"""
+def compare_with_baseline(results, baseline, threshold):
+    baseline_results = {(result["scale"], result["concurrency"], result["route"]): result for result in baseline["results"]}
+    regressions = []
+    print(f"\nComparison with the baseline of {baseline['metadata']['createdAt']} (threshold {threshold:.0%})")
+    for result in results:
+        baseline_result = baseline_results.get((result["scale"], result["concurrency"], result["route"]))
+        if not baseline_result or not baseline_result["p95Ms"] or not baseline_result["requestsPerSecond"] or not result["p95Ms"]:
+            continue
+        p95_change = result["p95Ms"] / baseline_result["p95Ms"] - 1
+        throughput_change = result["requestsPerSecond"] / baseline_result["requestsPerSecond"] - 1
+        name = f"{result['scale']} x{result['concurrency']} {result['route']}"
+        regressed = p95_change > threshold or throughput_change < -threshold
+        if regressed:
+            regressions.append(name)
+        print(f"  {name:<56} p95 {p95_change:>+7.1%}  req/s {throughput_change:>+7.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test every API route and report requests per second and latency percentiles")
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser("serve", help="Serve the app on a fresh database (used by the benchmark)")
+    serve_parser.add_argument("--database", required=True, help="Path of the database file")
+    serve_parser.add_argument("--port", type=int, required=True, help="Port of the server")
+    parser.add_argument("--scales", default="small", help=f"Comma separated dataset scales ({', '.join(SCALES)})")
+    parser.add_argument("--concurrency", default="1,8", help="Comma separated numbers of concurrent clients")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS, help="Number of measured requests per route and concurrency")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="Number of requests per route sent before measuring")
+    parser.add_argument("--routes", help="Only run the routes whose name contains this text")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the datasets and requests")
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one, the datasets are imported into its database")
+    parser.add_argument("--output", default="benchmark_results.json", help="Path of the JSON results")
+    parser.add_argument("--baseline", help="Path of the JSON results of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Regression threshold as a fraction (0.1 is 10%%)")
+    arguments = parser.parse_args()
+
+    if arguments.command == "serve":
+        serve(arguments.database, arguments.port)
+        sys.exit(0)
+
+    scales = [scale.strip() for scale in arguments.scales.split(",")]
+    if not set(scales).issubset(SCALES):
+        parser.error(f"Scales must be among {', '.join(SCALES)}")
+    arguments.concurrency = [int(concurrency) for concurrency in arguments.concurrency.split(",")]
+    routes = [route for route in READ_ROUTES + WRITE_ROUTES if not arguments.routes or arguments.routes in route[0]]
+
+    results = []
+    for scale in scales:
+        if arguments.url:
+            url = urlparse(arguments.url)
+            results.extend(run_scale(url.hostname, url.port or 80, scale, arguments, routes))
+            continue
+        with tempfile.TemporaryDirectory() as directory:
+            server, port = start_server(os.path.join(directory, "benchmark.db"))
+            try:
+                results.extend(run_scale("127.0.0.1", port, scale, arguments, routes))
+            finally:
+                server.terminate()
+                server.wait()
+
+    report = {
+        "metadata": {
+            "createdAt": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "gitCommit": get_git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "url": arguments.url,
+            "scales": scales,
+            "concurrency": arguments.concurrency,
+            "requests": arguments.requests,
+            "warmup": arguments.warmup,
+            "seed": arguments.seed,
+        },
+        "results": results,
+    }
+    with open(arguments.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {arguments.output}")
+
+    if arguments.baseline:
+        with open(arguments.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_with_baseline(results, json.load(f), arguments.threshold)
+        if regressions:
+            print(f"{len(regressions)} routes regressed")
+            sys.exit(1)
@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from flask import Flask, jsonify
+
+from init_db import migrate_db
+from json_encoding import encode_array, encode_envelope, orjson
+
+"""
+Microbenchmark of the serialization of a large nodes list, comparing the response paths of GET /prompts/:id/nodes
+
+- dict rows + jsonify is the previous path: a dict per row, merged into a copy of the envelope and encoded by Flask's default encoder
+- dict rows + fast encoder builds the same dicts but encodes them with json_encoding.dumps (orjson when it is installed)
+- SQLite json_object + envelope is the current path for pages: SQLite builds the JSON of every row, which is written directly into the envelope
+- SQLite json_group_array + envelope is the current path for full lists: SQLite builds the whole JSON array in a single row
+"""
+
+def create_database(node_count):
+    database_connection = sqlite3.connect(":memory:")
+    database_connection.row_factory = sqlite3.Row
+    migrate_db(database_connection)
+    database_connection.execute("INSERT INTO PROJECTS (name) VALUES ('Benchmark')")
+    database_connection.execute("INSERT INTO PROMPTS (title, project_id) VALUES ('Benchmark', 1)")
+    database_connection.executemany(
+        "INSERT INTO NODES (prompt_id, name, action) VALUES (1, ?, ?)",
+        ((f"Node {index}", f"Action of node {index} " * 8) for index in range(node_count))
+    )
+    database_connection.commit()
+    return database_connection
+
+def dict_rows_jsonify(database_connection):
+    node_rows = database_connection.execute("SELECT node_id, name, action FROM NODES WHERE prompt_id = 1 ORDER BY node_id").fetchall()
+    nodes = [{"name": row["name"], "action": row["action"]} for row in node_rows]
+    response = {"responseCode": None, "responseMessage": None}
+    response.update({"nodes": nodes})
+    response["responseCode"] = 200
+    response["responseMessage"] = "Success"
+    return jsonify(response).get_data()
+
+def dict_rows_fast_encoder(database_connection):
+    node_rows = database_connection.execute("SELECT node_id, name, action FROM NODES WHERE prompt_id = 1 ORDER BY node_id").fetchall()
+    nodes = [{"name": row["name"], "action": row["action"]} for row in node_rows]
+    return encode_envelope(200, "Success", {"nodes": nodes})
+
+def sqlite_json_envelope(database_connection):
+    node_cursor = database_connection.cursor()
+    node_cursor.row_factory = None
+    node_rows = node_cursor.execute(
+        "SELECT node_id, json_object('name', name, 'action', action) FROM NODES WHERE prompt_id = 1 ORDER BY node_id"
+    ).fetchall()
+    return encode_envelope(200, "Success", encoded_fields={"nodes": encode_array([row[1] for row in node_rows])})
+
+def sqlite_json_array_envelope(database_connection):
+    nodes_json = database_connection.execute(
+        "SELECT json_group_array(json_object('name', name, 'action', action)) FROM (SELECT name, action FROM NODES WHERE prompt_id = 1 ORDER BY node_id)"
+    ).fetchone()[0]
+    return encode_envelope(200, "Success", encoded_fields={"nodes": nodes_json})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the serialization of a large nodes list")
+    parser.add_argument("--nodes", type=int, default=10000, help="Number of nodes in the list")
+    parser.add_argument("--repeat", type=int, default=20, help="Number of serializations per measurement")
+    arguments = parser.parse_args()
+
+    database_connection = create_database(arguments.nodes)
+    candidates = [
+        ("dict rows + jsonify", dict_rows_jsonify),
+        ("dict rows + fast encoder", dict_rows_fast_encoder),
+        ("SQLite json_object + envelope", sqlite_json_envelope),
+        ("SQLite json_group_array + envelope", sqlite_json_array_envelope),
+    ]
+    app = Flask(__name__)
+    with app.app_context():
+        # Every path must produce the same document
+        documents = [json.loads(serialize(database_connection)) for _, serialize in candidates]
+        assert all(document == documents[0] for document in documents)
+
+        print(f"Serializing {arguments.nodes} nodes, encoder: {'orjson' if orjson else 'json (standard library)'}")
+        baseline = None
+        for name, serialize in candidates:
+            seconds = min(timeit.repeat(lambda: serialize(database_connection), number=arguments.repeat, repeat=3)) / arguments.repeat
+            baseline = baseline or seconds
+            print(f"{name:<36} {seconds * 1000:8.2f} ms  {baseline / seconds:5.2f}x")
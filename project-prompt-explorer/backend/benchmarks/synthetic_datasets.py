@@ -0,0 +1,69 @@
+import argparse
+import json
+import random
+
+"""
+Synthetic datasets for the API benchmarks, in the prompt_list.json shape
+
+- Every prompt has nodes_per_prompt subprompts and notes_per_prompt notes, the notes are not part of the prompt_list.json shape
+  and are ignored by the bulk import, so the benchmark adds them through the notes batch endpoint
+- The text is generated from a seeded random generator, so the same scale and seed always produce the same file
+"""
+
+# Scale presets as (prompt chain length, nodes per prompt, notes per prompt)
+SCALES = {
+    "small": (50, 5, 5),
+    "medium": (500, 20, 20),
+    "large": (2000, 50, 50),
+}
+
+WORDS = (
+    "track", "car", "engine", "physics", "camera", "shader", "texture", "collision", "opponent", "lap",
+    "checkpoint", "boost", "drift", "terrain", "lighting", "sound", "particle", "menu", "score", "replay",
+    "render", "scene", "model", "wheel", "steering", "brake", "speed", "gear", "timer", "minimap",
+)
+
+def generate_text(rng, word_count):
+    return " ".join(rng.choice(WORDS) for _ in range(word_count))
+
+def generate_dataset(chain_length, nodes_per_prompt, notes_per_prompt, seed=0, name="Benchmark"):
+    rng = random.Random(seed)
+    prompts = []
+    for index in range(chain_length):
+        prompts.append({
+            "id": index + 1,
+            "title": f"Prompt {index + 1} {generate_text(rng, 3)}",
+            "description": generate_text(rng, 20),
+            "subprompts": [
+                {"name": f"{generate_text(rng, 2)} {node_index + 1}", "action": generate_text(rng, 25)}
+                for node_index in range(nodes_per_prompt)
+            ],
+            "notes": [generate_text(rng, 15) for _ in range(notes_per_prompt)],
+        })
+    return {
+        "project": name,
+        "mainRequest": generate_text(rng, 20),
+        "prompts": prompts,
+        "finalIntegration": generate_text(rng, 20),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic prompt list file for the API benchmarks")
+    parser.add_argument("output", help="Path of the generated file")
+    parser.add_argument("--scale", choices=SCALES, default="small", help="Preset of the prompt chain length, nodes and notes per prompt")
+    parser.add_argument("--chain-length", type=int, help="Number of prompts in the chain, overrides the scale")
+    parser.add_argument("--nodes-per-prompt", type=int, help="Number of nodes per prompt, overrides the scale")
+    parser.add_argument("--notes-per-prompt", type=int, help="Number of notes per prompt, overrides the scale")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random text")
+    arguments = parser.parse_args()
+
+    chain_length, nodes_per_prompt, notes_per_prompt = SCALES[arguments.scale]
+    dataset = generate_dataset(
+        arguments.chain_length or chain_length,
+        arguments.nodes_per_prompt or nodes_per_prompt,
+        arguments.notes_per_prompt or notes_per_prompt,
+        seed=arguments.seed
+    )
+    with open(arguments.output, "w", encoding="utf-8") as f:
+        json.dump(dataset, f)
+    print(f"Generated {len(dataset['prompts'])} prompts in {arguments.output}")
@@ -0,0 +1,232 @@
+import argparse
+import json
+import sys
+import time
+
+from init_db import INDEXES, SEARCH_TABLES, create_indexes, get_db_connection, get_search_triggers, migrate_db
+
+BATCH_SIZE = 5000
+READ_SIZE = 65536
+
+class PromptListError(ValueError):
+    pass
+
+"""
+Incrementally read a prompt list file (in the prompt_list.json shape) from a text stream
+
+- Iterating yields ("prompt", prompt) for every element of the prompts array and (key, value) for the other top-level keys, in file order
+- The file is read in chunks and only the current prompt is decoded at a time, so memory stays flat regardless of the file size
+"""
+class PromptListReader:
+    def __init__(self, text_stream, read_size=READ_SIZE):
+        self.text_stream = text_stream
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def read_more(self):
+        # Drop the consumed part of the buffer before appending the next chunk
+        chunk = self.text_stream.read(self.read_size)
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        if not chunk:
+            self.eof = True
+
+    def peek(self):
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if self.eof:
+                raise PromptListError("Unexpected end of the prompt list")
+            self.read_more()
+
+    def expect(self, character):
+        if self.peek() != character:
+            raise PromptListError(f"Expected '{character}' in the prompt list")
+        self.position += 1
+
+    def skip_separator(self):
+        if self.peek() == ",":
+            self.position += 1
+            return True
+        return False
+
+    def decode_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A value that ends at the end of the buffer might continue in the next chunk (e.g. a number)
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise PromptListError(f"Invalid JSON in the prompt list: {e.msg}")
+            self.read_more()
+
+    def __iter__(self):
+        self.expect("{")
+        if self.peek() == "}":
+            return
+        while True:
+            key = self.decode_value()
+            if not isinstance(key, str):
+                raise PromptListError("Expected a key in the prompt list")
+            self.expect(":")
+            if key == "prompts":
+                self.expect("[")
+                if self.peek() == "]":
+                    self.position += 1
+                else:
+                    while True:
+                        yield "prompt", self.decode_value()
+                        if not self.skip_separator():
+                            self.expect("]")
+                            break
+            else:
+                yield key, self.decode_value()
+            if not self.skip_separator():
+                self.expect("}")
+                break
+
+"""
+Get the next ID of a table with an AUTOINCREMENT primary key, which is never lower than an ID that was used before
+"""
+def get_next_id(database_cursor, table, id_column):
+    sequence_row = database_cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    max_row = database_cursor.execute(f"SELECT MAX({id_column}) FROM {table}").fetchone()
+    return max(sequence_row[0] if sequence_row else 0, max_row[0] or 0) + 1
+
+"""
+Bulk import a prompt list file as a new project
+
+- The whole import runs in a single transaction, so a failed import leaves the database unchanged
+- Prompt and node IDs are allocated up front while the write lock is held, so rows are inserted with executemany in batches
+  instead of one insert (and ID lookup) per row
+- With defer_indexes=True the secondary indexes are dropped during the import and rebuilt once at the end, which is faster for large files
+- The full-text search triggers of prompts and nodes are suspended during the import, and the new rows are indexed with one statement per table at the end
+- project_id is the ID of the new project, which is allocated by the database when it is not given
+- Returns the statistics of the import, including the number of rows inserted per second
+"""
+def import_prompt_list(database_connection, text_stream, batch_size=BATCH_SIZE, defer_indexes=False, project_id=None):
+    started_at = time.perf_counter()
+    database_cursor = database_connection.cursor()
+    database_cursor.execute("BEGIN IMMEDIATE")
+    try:
+        if defer_indexes:
+            for index_name in INDEXES:
+                database_cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+        # Schema changes are part of the transaction, so the triggers are restored if the import fails
+        search_tables = [search_table for search_table in SEARCH_TABLES if search_table[1] in ("PROMPTS", "NODES")]
+        for fts_table, _, _, _ in search_tables:
+            database_cursor.execute(f"DROP TRIGGER IF EXISTS {fts_table}_insert")
+
+        # The project is inserted up front so prompts can reference it, and its details are updated at the end
+        # as the top-level keys might come after the prompts in the file
+        database_cursor.execute("INSERT INTO PROJECTS (project_id, name) VALUES (?, '')", (project_id,))
+        project_id = database_cursor.lastrowid
+        project = {}
+
+        first_prompt_id = next_prompt_id = get_next_id(database_cursor, "PROMPTS", "prompt_id")
+        first_node_id = next_node_id = get_next_id(database_cursor, "NODES", "node_id")
+        prompt_rows = []
+        node_rows = []
+        prompt_count = 0
+        node_count = 0
+        last_prompt_id = None
+
+        def flush():
+            # Prompts are flushed before nodes, as nodes reference the prompts of the same batch
+            database_cursor.executemany(
+                "INSERT INTO PROMPTS (prompt_id, title, description, parent_prompt_id, project_id) VALUES (?, ?, ?, ?, ?)",
+                prompt_rows
+            )
+            database_cursor.executemany(
+                "INSERT INTO NODES (node_id, prompt_id, name, action) VALUES (?, ?, ?, ?)",
+                node_rows
+            )
+            prompt_rows.clear()
+            node_rows.clear()
+
+        for key, value in PromptListReader(text_stream):
+            if key != "prompt":
+                project[key] = value
+                continue
+            if not isinstance(value, dict) or not value.get("title"):
+                raise PromptListError(f"Prompt {prompt_count + 1} must be an object with a title")
+            if not isinstance(value.get("subprompts", []), list):
+                raise PromptListError(f"The subprompts of prompt {prompt_count + 1} must be a list")
+            prompt_id = next_prompt_id
+            next_prompt_id += 1
+            # Next prompt becomes a child of the current prompt (simple chain as the prompts are provided as a simple list)
+            prompt_rows.append((prompt_id, value.get("title"), value.get("description"), last_prompt_id, project_id))
+            last_prompt_id = prompt_id
+            prompt_count += 1
+            for subprompt in value.get("subprompts", []):
+                if not isinstance(subprompt, dict) or not subprompt.get("name"):
+                    raise PromptListError(f"Every subprompt of prompt {prompt_count} must be an object with a name")
+                node_rows.append((next_node_id, prompt_id, subprompt.get("name"), subprompt.get("action")))
+                next_node_id += 1
+                node_count += 1
+            if len(prompt_rows) + len(node_rows) >= batch_size:
+                flush()
+        flush()
+
+        if not project.get("project"):
+            raise PromptListError("The prompt list must have a project name")
+        database_cursor.execute(
+            "UPDATE PROJECTS SET name = ?, main_request = ?, final_integration = ? WHERE project_id = ?",
+            (project.get("project"), project.get("mainRequest"), project.get("finalIntegration"), project_id)
+        )
+
+        first_ids = {"PROMPTS": first_prompt_id, "NODES": first_node_id}
+        for fts_table, table, id_column, columns in search_tables:
+            column_list = ", ".join(columns)
+            database_cursor.execute(
+                f"INSERT INTO {fts_table} (rowid, {column_list}) SELECT {id_column}, {column_list} FROM {table} WHERE {id_column} >= ?",
+                (first_ids[table],)
+            )
+            database_cursor.execute(get_search_triggers(fts_table, table, id_column, columns)[f"{fts_table}_insert"])
+        if defer_indexes:
+            create_indexes(database_cursor)
+        database_connection.commit()
+    except Exception:
+        database_connection.rollback()
+        raise
+
+    seconds = time.perf_counter() - started_at
+    row_count = 1 + prompt_count + node_count
+    return {
+        "projectId": project_id,
+        "prompts": prompt_count,
+        "nodes": node_count,
+        "seconds": round(seconds, 3),
+        "rowsPerSecond": round(row_count / seconds) if seconds > 0 else None
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import a prompt list file (in the prompt_list.json shape) as a new project")
+    parser.add_argument("path", help="Path of the prompt list file")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Number of rows inserted per executemany batch")
+    parser.add_argument("--defer-indexes", action="store_true", help="Drop the secondary indexes during the import and rebuild them at the end")
+    arguments = parser.parse_args()
+
+    database_connection = get_db_connection()
+    migrate_db(database_connection)
+    try:
+        with open(arguments.path, "r", encoding="utf-8") as f:
+            stats = import_prompt_list(database_connection, f, batch_size=arguments.batch_size, defer_indexes=arguments.defer_indexes)
+    except (OSError, ValueError) as e:
+        print(f"Error importing prompt list: {e}")
+        sys.exit(1)
+    finally:
+        database_connection.close()
+    print(
+        f"Imported project {stats['projectId']} with {stats['prompts']} prompts and {stats['nodes']} nodes "
+        f"in {stats['seconds']}s ({stats['rowsPerSecond']} rows/s)"
+    )
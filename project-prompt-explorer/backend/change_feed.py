@@ -0,0 +1,175 @@
+import os
+import threading
+import time
+
+from flask import Response
+
+from connection_pool import get_pool
+
+# An event stream checks the change log at least every EVENTS_POLL_SECONDS, which picks up the changes committed by other processes,
+# and the changes committed by this process are pushed right away
+# A comment is sent every EVENTS_HEARTBEAT_SECONDS while there is no change, so proxies keep the stream open and closed clients are detected
+EVENTS_POLL_SECONDS = float(os.environ.get("EVENTS_POLL_SECONDS", "1"))
+EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("EVENTS_HEARTBEAT_SECONDS", "15"))
+# Maximum number of changes read from the change log at once
+EVENTS_BATCH_SIZE = 500
+# Delay in milliseconds before the browser reconnects a closed stream, sent at the start of every stream
+EVENTS_RETRY_MS = 1000
+
+# Number of changes kept in the change log of a database, older changes are pruned as new ones are recorded
+# A client that reconnects after more changes than this only receives the changes that are still in the change log
+EVENTS_RETENTION = int(os.environ.get("EVENTS_RETENTION", "100000"))
+
+# SQL that records the new rows of each change type in the change log
+# - Only the IDs of the rows are recorded, and the JSON of a row is built from the base table when its event is sent
+# - The IDs of the new rows are passed as a JSON array, so a batch is recorded with a single statement
+# - The rows are recorded in ID order, so the events of a batch are sent in the order the rows were added
+CHANGE_QUERIES = {
+    "prompt": """
+        INSERT INTO CHANGES (project_id, prompt_id, type, row_id)
+        SELECT project_id, prompt_id, 'prompt', prompt_id
+        FROM PROMPTS
+        WHERE prompt_id IN (SELECT value FROM json_each(?))
+        ORDER BY prompt_id
+    """,
+    "node": """
+        INSERT INTO CHANGES (project_id, prompt_id, type, row_id)
+        SELECT PROMPTS.project_id, NODES.prompt_id, 'node', NODES.node_id
+        FROM NODES
+        JOIN PROMPTS ON PROMPTS.prompt_id = NODES.prompt_id
+        WHERE NODES.node_id IN (SELECT value FROM json_each(?))
+        ORDER BY NODES.node_id
+    """,
+    "note": """
+        INSERT INTO CHANGES (project_id, prompt_id, type, row_id)
+        SELECT PROMPTS.project_id, NOTES.prompt_id, 'note', NOTES.note_id
+        FROM NOTES
+        JOIN PROMPTS ON PROMPTS.prompt_id = NOTES.prompt_id
+        WHERE NOTES.note_id IN (SELECT value FROM json_each(?))
+        ORDER BY NOTES.note_id
+    """,
+}
+PRUNE_CHANGES_QUERY = "DELETE FROM CHANGES WHERE change_id <= (SELECT MAX(change_id) FROM CHANGES) - ?"
+
+# JSON of the row of each change type, built by SQLite from the base table with the row_id of the change
+CHANGE_ROW_JSON = {
+    "prompt": "SELECT json_object('id', prompt_id, 'title', title, 'description', description, 'parentPromptId', parent_prompt_id, 'projectId', project_id) FROM PROMPTS WHERE prompt_id = CHANGES.row_id",
+    "node": "SELECT json_object('id', node_id, 'promptId', prompt_id, 'name', name, 'action', action) FROM NODES WHERE node_id = CHANGES.row_id",
+    "note": "SELECT json_object('id', note_id, 'promptId', prompt_id, 'content', content, 'createdAt', created_at) FROM NOTES WHERE note_id = CHANGES.row_id",
+}
+
+# Columns the event streams filter the change log by
+CHANGE_STREAM_COLUMNS = ("prompt_id", "project_id")
+
+# Changes of a prompt or project after a change ID with the JSON of their rows, where {column} is one of CHANGE_STREAM_COLUMNS
+# The JSON is NULL if the row was deleted since the change was recorded
+CHANGES_AFTER_QUERY = (
+    "SELECT change_id, type, CASE type "
+    + " ".join(f"WHEN '{change_type}' THEN ({row_json})" for change_type, row_json in CHANGE_ROW_JSON.items())
+    + " END FROM CHANGES WHERE {column} = ? AND change_id > ? ORDER BY change_id LIMIT ?"
+)
+LAST_CHANGE_QUERY = "SELECT COALESCE(MAX(change_id), 0) FROM CHANGES"
+
+"""
+Record new rows in the change log
+
+- This runs in the transaction that adds the rows, so a change is visible to the event streams exactly when its row is committed
+- change_type is one of prompt, node and note, and row_ids are the IDs of the new rows
+- The changes older than the last EVENTS_RETENTION changes are pruned in the same transaction, which is a range delete on the primary key
+"""
+def record_changes(database_cursor, change_type, row_ids):
+    database_cursor.execute(CHANGE_QUERIES[change_type], (f"[{','.join(str(row_id) for row_id in row_ids)}]",))
+    database_cursor.execute(PRUNE_CHANGES_QUERY, (EVENTS_RETENTION,))
+
+"""
+Get the ID of the last change of a database, which is where a stream without Last-Event-ID starts
+"""
+def get_last_change_id(database_cursor):
+    return database_cursor.execute(LAST_CHANGE_QUERY).fetchone()[0]
+
+"""
+Wake the event streams of a database up when changes are committed
+
+- Each database has a counter that is bumped by notify, and a stream waits until the counter of its database changes
+- This only covers the writes of this process, the streams also poll the change log for the writes of other processes
+"""
+class ChangeNotifier:
+    def __init__(self):
+        self._versions = {}
+        self._condition = threading.Condition()
+
+    def get_version(self, database):
+        with self._condition:
+            return self._versions.get(database, 0)
+
+    def notify(self, database):
+        with self._condition:
+            self._versions[database] = self._versions.get(database, 0) + 1
+            self._condition.notify_all()
+
+    def wait(self, database, version, timeout):
+        with self._condition:
+            self._condition.wait_for(lambda: self._versions.get(database, 0) != version, timeout)
+
+change_notifier = ChangeNotifier()
+
+"""
+Read the changes of a prompt or project after a change ID, as (change_id, type, data) rows, where data is the JSON of the row
+
+- The connection is checked out of the pool only for the query, so an open stream doesn't hold a connection while it waits
+"""
+def read_changes(database, column, value, after_change_id):
+    pool = get_pool(database)
+    database_connection = pool.acquire()
+    try:
+        database_cursor = database_connection.cursor()
+        database_cursor.row_factory = None
+        return database_cursor.execute(
+            CHANGES_AFTER_QUERY.format(column=column),
+            (value, after_change_id, EVENTS_BATCH_SIZE)
+        ).fetchall()
+    finally:
+        pool.release(database_connection)
+
+def format_event(change_id, change_type, data):
+    return f"id: {change_id}\nevent: {change_type}\ndata: {data}\n\n"
+
+"""
+Stream the changes of a prompt or project after a change ID as Server-Sent Events
+
+- Every event has the change ID as its id, the change type as its event name and the JSON of the new row as its data,
+  so a browser that reconnects sends the last ID as Last-Event-ID and only receives the changes it missed
+- The stream waits for the notifier between reads, and polls the change log every EVENTS_POLL_SECONDS
+- The first chunk is sent right away, so the response headers reach the client before the first change
+"""
+def stream_changes(database, column, value, after_change_id):
+    if column not in CHANGE_STREAM_COLUMNS:
+        raise ValueError(f"Unsupported change stream column: {column}")
+
+    def generate():
+        last_change_id = after_change_id
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        last_sent_at = time.monotonic()
+        while True:
+            # The version is read before the change log, so a change committed after the read wakes the stream up
+            version = change_notifier.get_version(database)
+            change_rows = read_changes(database, column, value, last_change_id)
+            if change_rows:
+                last_change_id = change_rows[-1][0]
+                # The changes of deleted rows are skipped
+                events = "".join(format_event(*row) for row in change_rows if row[2] is not None)
+                if events:
+                    yield events
+                    last_sent_at = time.monotonic()
+                if len(change_rows) == EVENTS_BATCH_SIZE:
+                    continue
+            elif time.monotonic() - last_sent_at >= EVENTS_HEARTBEAT_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent_at = time.monotonic()
+            change_notifier.wait(database, version, EVENTS_POLL_SECONDS)
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # Proxies such as nginx must not buffer the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
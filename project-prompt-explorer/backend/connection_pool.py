@@ -0,0 +1,167 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from metrics import CONNECTION_OPEN_DURATION, InstrumentedConnection
+
+# PRAGMAs applied once when a connection is opened, instead of on every request
+# - journal_mode=WAL lets readers run concurrently with the single writer
+# - synchronous=NORMAL is durable with WAL and avoids an fsync on every commit
+# - mmap_size and cache_size keep hot pages in memory (a negative cache_size is in KiB)
+CONNECTION_PRAGMAS = (
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA busy_timeout = 5000",
+)
+
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+# Streamed responses keep their connection until the client has read the whole body, so they use a separate pool of
+# DB_STREAM_POOL_SIZE connections per database, and slow clients never take the connections of the other requests
+STREAM_POOL_SIZE = int(os.environ.get("DB_STREAM_POOL_SIZE", "4"))
+
+class PoolTimeoutError(Exception):
+    pass
+
+"""
+Open a new connection to the SQLite database at the given path and apply the connection PRAGMAs
+
+- Connections are not bound to the thread that opened them, as the pool hands them out to different worker threads
+- A connection is only ever used by one thread at a time, as it is checked out of the pool for the duration of a request
+- Connections record the time and row count of every statement, which are exposed by GET /metrics
+"""
+def open_connection(database):
+    started_at = time.perf_counter()
+    database_connection = sqlite3.connect(database, check_same_thread=False, factory=InstrumentedConnection)
+    # This helps to return rows as dictionaries instead of tuples
+    database_connection.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        database_connection.execute(pragma)
+    CONNECTION_OPEN_DURATION.observe(time.perf_counter() - started_at)
+    return database_connection
+
+"""
+Bounded pool of SQLite connections for a single database file
+
+- Idle connections are reused (most recently used first), so PRAGMA setup only happens when a connection is first opened
+- At most max_size connections are checked out at once, and acquire waits up to timeout seconds for one to be released
+- Connections are rolled back when released, so a failed request never leaks an open transaction into the next one
+"""
+class ConnectionPool:
+    def __init__(self, database, max_size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.database = database
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle_connections = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(f"No database connection available after {self.timeout} seconds")
+        try:
+            return self._idle_connections.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return open_connection(self.database)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, database_connection):
+        try:
+            if database_connection.in_transaction:
+                database_connection.rollback()
+            self._idle_connections.put(database_connection)
+        except sqlite3.Error:
+            # A broken connection is dropped and a fresh one is opened on the next acquire
+            database_connection.close()
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle_connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+_pools = {}
+_stream_pools = {}
+_pools_lock = threading.Lock()
+
+def get_or_create_pool(pools, database, max_size):
+    pool = pools.get(database)
+    if pool is None:
+        with _pools_lock:
+            pool = pools.get(database)
+            if pool is None:
+                pool = ConnectionPool(database, max_size=max_size)
+                pools[database] = pool
+    return pool
+
+"""
+Get the connection pool for the given database file, creating it on first use
+"""
+def get_pool(database):
+    return get_or_create_pool(_pools, database, POOL_SIZE)
+
+"""
+Get the pool of the streamed responses for the given database file, creating it on first use
+"""
+def get_stream_pool(database):
+    return get_or_create_pool(_stream_pools, database, STREAM_POOL_SIZE)
+
+"""
+Close the idle connections of a database's pools and forget the pools, for a database file that is deleted
+"""
+def close_pool(database):
+    with _pools_lock:
+        pools = [pools.pop(database, None) for pools in (_pools, _stream_pools)]
+    for pool in pools:
+        if pool is not None:
+            pool.close_all()
+
+"""
+Close the idle connections of every pool and forget the pools
+"""
+def close_pools():
+    with _pools_lock:
+        for pools in (_pools, _stream_pools):
+            for pool in pools.values():
+                pool.close_all()
+            pools.clear()
+
+"""
+Open the connections of a database's pool up front, so the first requests don't wait for them to be opened
+
+- The connections are checked out together, so each one is a new connection, and a first query loads the schema before they are returned to the pool
+- Returns the number of warmed connections
+"""
+def warm_pool(database, count=POOL_SIZE):
+    pool = get_pool(database)
+    database_connections = []
+    try:
+        for _ in range(min(count, pool.max_size)):
+            database_connection = pool.acquire()
+            database_connections.append(database_connection)
+            database_connection.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    finally:
+        for database_connection in database_connections:
+            pool.release(database_connection)
+    return len(database_connections)
+
+"""
+Forget the pools inherited from the parent process in a forked worker, without closing their connections
+
+- SQLite connections must not be used across a fork, and closing the last connection to a database in the child could checkpoint and delete the WAL file the parent still uses
+"""
+def forget_pools():
+    with _pools_lock:
+        _pools.clear()
+        _stream_pools.clear()
@@ -0,0 +1,57 @@
+import multiprocessing
+import os
+import sys
+
+# Production server: gunicorn -c gunicorn.conf.py (pip install -r requirements-prod.txt)
+# - The app is imported once in the master process (preload_app) and forked into WORKERS worker processes, one per core by default
+# - Every worker serves the ASGI app of asgi.py, so open event streams run on their own executor and never take the threads of the other requests
+# - The schema is migrated once in the master before the workers are forked, and nothing is seeded (python init_db.py seeds the database)
+# - Every worker opens and warms its own pooled connections after the fork
+# - kill -HUP <master pid> replaces the workers gracefully (in-flight requests finish first), and kill -TERM shuts the server down gracefully
+# - The new workers of kill -HUP are forked from the app preloaded in the master, so new code is only loaded by restarting the master
+
+# gunicorn reads this file before importing the app, so the backend modules are imported from this directory wherever gunicorn is started
+BACKEND_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BACKEND_DIRECTORY)
+chdir = BACKEND_DIRECTORY
+
+from connection_pool import close_pools, forget_pools, open_connection, warm_pool
+from init_db import DATABASE, migrate_db
+from shard_router import ShardRouter
+
+wsgi_app = "asgi:application"
+bind = os.environ.get("BIND", f"127.0.0.1:{os.environ.get('PORT', '5001')}")
+workers = int(os.environ.get("WORKERS", str(multiprocessing.cpu_count())))
+preload_app = True
+
+# Every worker runs an event loop that reads the requests and sends the responses, see asgi.py for its executors:
+# - The route handlers run on ASGI_DATABASE_THREADS threads (defaults to DB_POOL_SIZE), as a handler holds one connection at a time
+# - Event streams run on ASGI_EVENT_STREAM_THREADS threads (default 64), which caps the open streams that are served at once by a worker
+# - GET /healthz is answered on the event loop, so the liveness probe never waits for a thread
+worker_class = "uvicorn_worker.UvicornWorker"
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+"""
+Migrate the main database and the project databases in the master process, before the workers are forked
+
+- The connections are closed before the fork, as SQLite connections must not be carried over to a child process
+"""
+def on_starting(server):
+    database_connection = open_connection(DATABASE)
+    try:
+        schema_version = migrate_db(database_connection)
+    finally:
+        database_connection.close()
+    # Listing the project databases migrates them
+    databases = ShardRouter(DATABASE).get_databases()
+    close_pools()
+    server.log.info(f"Schema at version {schema_version} in {len(databases)} database(s)")
+
+"""
+Give every worker its own connections, opened and warmed before it accepts requests
+"""
+def post_fork(server, worker):
+    forget_pools()
+    connection_count = warm_pool(DATABASE)
+    server.log.info(f"Worker {worker.pid} warmed {connection_count} database connections")
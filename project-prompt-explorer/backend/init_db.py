@@ -1,140 +1,433 @@
-import sqlite3
+import hashlib
 import json
 import os
+import sys
+
+from connection_pool import open_connection
+from queries import CHAIN_PROMPT_ID_COLUMNS, CHAIN_PROMPTS_QUERY
 
 DATABASE = os.path.abspath(os.path.join(os.path.dirname(__file__), 'projects.db'))
 PROMPT_FILE = 'prompt_list.json'
 
+# Secondary indexes for the columns the API filters and orders by
+# - PROMPTS are listed by project in chain order and the child of a prompt is looked up by its parent
+# - The unique index on parent_prompt_id enforces that a prompt has at most one child prompt, which keeps the prompts in a chain
+# - NODES are listed by prompt in node ID order and NOTES by prompt in reverse chronological order
+INDEXES = {
+    "idx_prompts_project": "CREATE INDEX IF NOT EXISTS idx_prompts_project ON PROMPTS (project_id, prompt_id)",
+    "idx_prompts_parent": "CREATE UNIQUE INDEX IF NOT EXISTS idx_prompts_parent ON PROMPTS (parent_prompt_id)",
+    "idx_nodes_prompt": "CREATE INDEX IF NOT EXISTS idx_nodes_prompt ON NODES (prompt_id, node_id)",
+    "idx_notes_prompt_created": "CREATE INDEX IF NOT EXISTS idx_notes_prompt_created ON NOTES (prompt_id, created_at DESC, note_id DESC)",
+}
+
 """
-Initialize database referenced in DATABASE and load data from JSON file referenced in PROMPT_FILE and seed it into the database
+Create the tables of the schema if they don't exist
 """
-def init_db():
-    try:
-        database_connection = get_db_connection()
-        database_cursor = database_connection.cursor()
-
-        # Drop tables to update schema in a clean database
-        database_cursor.execute("DROP TABLE IF EXISTS NOTES")
-        database_cursor.execute("DROP TABLE IF EXISTS NODES")
-        database_cursor.execute("DROP TABLE IF EXISTS PROMPTS")
-        database_cursor.execute("DROP TABLE IF EXISTS PROJECTS")
-
-        # Create tables
-        database_cursor.execute('''
-            CREATE TABLE IF NOT EXISTS PROJECTS (
-                project_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                main_request TEXT,
-                final_integration TEXT
-            )
-        ''')
-    
-        database_cursor.execute('''
-            CREATE TABLE IF NOT EXISTS PROMPTS (
-                prompt_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                description TEXT,
-                parent_prompt_id INTEGER,
-                project_id INTEGER,
-                FOREIGN KEY (parent_prompt_id) REFERENCES PROMPTS(prompt_id) ON DELETE SET NULL,
-                FOREIGN KEY (project_id) REFERENCES PROJECTS(project_id) ON DELETE CASCADE
-            )
-        ''')
-    
-        database_cursor.execute('''
-            CREATE TABLE IF NOT EXISTS NODES (
-                node_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                prompt_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                action TEXT,
-                FOREIGN KEY (prompt_id) REFERENCES PROMPTS(prompt_id) ON DELETE CASCADE
+def create_tables(database_cursor):
+    database_cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PROJECTS (
+            project_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            main_request TEXT,
+            final_integration TEXT
+        )
+    ''')
+
+    database_cursor.execute('''
+        CREATE TABLE IF NOT EXISTS PROMPTS (
+            prompt_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            parent_prompt_id INTEGER,
+            project_id INTEGER,
+            FOREIGN KEY (parent_prompt_id) REFERENCES PROMPTS(prompt_id) ON DELETE SET NULL,
+            FOREIGN KEY (project_id) REFERENCES PROJECTS(project_id) ON DELETE CASCADE
+        )
+    ''')
+
+    database_cursor.execute('''
+        CREATE TABLE IF NOT EXISTS NODES (
+            node_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            prompt_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            action TEXT,
+            FOREIGN KEY (prompt_id) REFERENCES PROMPTS(prompt_id) ON DELETE CASCADE
+        )
+    ''')
+
+    database_cursor.execute('''
+        CREATE TABLE IF NOT EXISTS NOTES (
+            note_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            prompt_id INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (prompt_id) REFERENCES PROMPTS(prompt_id) ON DELETE CASCADE
+        )
+    ''')
+
+"""
+Create the secondary indexes that are missing
+
+- Creating the unique index on PROMPTS.parent_prompt_id fails if a prompt already has more than one child prompt
+"""
+def create_indexes(database_cursor):
+    for index_sql in INDEXES.values():
+        database_cursor.execute(index_sql)
+
+"""
+Add the columns and table used to keep track of the seeded rows
+
+- PROMPTS.seed_id is the ID of the prompt in the seed file and NODES.seed_position is the position of the node in its prompt's subprompts
+- METADATA stores the hash of the last imported seed file and the ID of the seeded project
+- A database created before versioning was seeded by dropping and reloading every table, so its first project is the seeded project,
+  which is adopted here instead of seeding a second copy (seed_db matches its prompts and nodes to the seed file)
+"""
+def add_seed_tracking(database_cursor):
+    database_cursor.execute("ALTER TABLE PROMPTS ADD COLUMN seed_id INTEGER")
+    database_cursor.execute("ALTER TABLE NODES ADD COLUMN seed_position INTEGER")
+    database_cursor.execute('''
+        CREATE TABLE IF NOT EXISTS METADATA (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+    project_row = database_cursor.execute("SELECT project_id FROM PROJECTS ORDER BY project_id LIMIT 1").fetchone()
+    if project_row:
+        set_metadata(database_cursor, "seed_project_id", str(project_row[0]))
+
+"""
+Add the version counters of projects and prompts, which are bumped on every write and used as the ETag of the GET responses
+
+- The project version changes when the tree changes (a prompt or node is added) and the prompt version when its details, nodes or notes change
+"""
+def add_versions(database_cursor):
+    database_cursor.execute("ALTER TABLE PROJECTS ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    database_cursor.execute("ALTER TABLE PROMPTS ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+
+# Full-text search tables, as FTS5 external content tables over the columns of the base tables
+# Each entry is the FTS table, the base table, its primary key and the indexed columns
+SEARCH_TABLES = (
+    ("PROMPTS_FTS", "PROMPTS", "prompt_id", ("title", "description")),
+    ("NODES_FTS", "NODES", "node_id", ("name", "action")),
+    ("NOTES_FTS", "NOTES", "note_id", ("content",)),
+)
+
+"""
+Get the SQL of the triggers that keep a full-text search table in sync with its base table, by trigger name
+"""
+def get_search_triggers(fts_table, table, id_column, columns):
+    column_list = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    return {
+        f"{fts_table}_insert": f'''
+            CREATE TRIGGER {fts_table}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.{id_column}, {new_values});
+            END
+        ''',
+        f"{fts_table}_delete": f'''
+            CREATE TRIGGER {fts_table}_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.{id_column}, {old_values});
+            END
+        ''',
+        f"{fts_table}_update": f'''
+            CREATE TRIGGER {fts_table}_update AFTER UPDATE OF {column_list} ON {table} BEGIN
+                INSERT INTO {fts_table} ({fts_table}, rowid, {column_list}) VALUES ('delete', old.{id_column}, {old_values});
+                INSERT INTO {fts_table} (rowid, {column_list}) VALUES (new.{id_column}, {new_values});
+            END
+        ''',
+    }
+
+"""
+Add the full-text search tables and the triggers that keep them in sync with the base tables
+
+- The FTS tables only store the index, the text is read from the base tables through content and content_rowid
+- The triggers update the index on every insert, update and delete of the base tables, whichever code path writes them
+- The index is built from the existing rows when the migration is applied
+"""
+def add_search_index(database_cursor):
+    for fts_table, table, id_column, columns in SEARCH_TABLES:
+        database_cursor.execute(
+            f"CREATE VIRTUAL TABLE {fts_table} USING fts5({', '.join(columns)}, content='{table}', content_rowid='{id_column}')"
+        )
+        for trigger_sql in get_search_triggers(fts_table, table, id_column, columns).values():
+            database_cursor.execute(trigger_sql)
+        database_cursor.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+
+"""
+Add the column that records which projects are stored in their own database file
+
+- PROJECTS.shard is the file name of the project's database in the shard directory, or NULL for the projects stored in this database
+"""
+def add_project_shards(database_cursor):
+    database_cursor.execute("ALTER TABLE PROJECTS ADD COLUMN shard TEXT")
+
+"""
+Add the change log of the rows added through the API, which the event streams read to push new prompts, nodes and notes
+
+- change_id only grows (AUTOINCREMENT never reuses an ID), so it is the ID of the events and a client resumes after the last one it received
+- Only the ID of the new row is recorded, and the event streams build the JSON of the row from its base table with row_id
+- The changes are listed by prompt for the prompt streams and by project for the project streams
+"""
+def add_change_log(database_cursor):
+    database_cursor.execute('''
+        CREATE TABLE IF NOT EXISTS CHANGES (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            prompt_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    database_cursor.execute("CREATE INDEX IF NOT EXISTS idx_changes_prompt ON CHANGES (prompt_id, change_id)")
+    database_cursor.execute("CREATE INDEX IF NOT EXISTS idx_changes_project ON CHANGES (project_id, change_id)")
+
+# Forward-only schema migrations, applied in order and recorded in SCHEMA_VERSION
+# New migrations must be appended with the next version number, and existing migrations must never be changed
+# The first migration uses CREATE TABLE IF NOT EXISTS, so databases created before versioning are migrated in place,
+# and the seed tracking migration adopts their seeded project
+MIGRATIONS = [
+    (1, create_tables),
+    (2, create_indexes),
+    (3, add_seed_tracking),
+    (4, add_versions),
+    (5, add_search_index),
+    (6, add_project_shards),
+    (7, add_change_log),
+]
+
+"""
+Get the version of the schema, which is the version of the last applied migration (0 for a new database)
+"""
+def get_schema_version(database_connection):
+    database_connection.execute("CREATE TABLE IF NOT EXISTS SCHEMA_VERSION (version INTEGER PRIMARY KEY, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)")
+    return database_connection.execute("SELECT COALESCE(MAX(version), 0) FROM SCHEMA_VERSION").fetchone()[0]
+
+"""
+Migrate the schema of the database to the latest version by applying the pending migrations
+
+- Each migration runs in its own transaction together with its SCHEMA_VERSION row, so a failed migration leaves the database at the previous version
+- This is safe to run on every start as the applied migrations are skipped
+"""
+def migrate_db(database_connection):
+    schema_version = get_schema_version(database_connection)
+    for version, migration in MIGRATIONS:
+        if version <= schema_version:
+            continue
+        database_connection.execute("BEGIN")
+        try:
+            migration(database_connection.cursor())
+            database_connection.execute("INSERT INTO SCHEMA_VERSION (version) VALUES (?)", (version,))
+            database_connection.commit()
+        except Exception:
+            database_connection.rollback()
+            raise
+    return MIGRATIONS[-1][0]
+
+"""
+Get and set a value in the METADATA table
+"""
+def get_metadata(database_cursor, key):
+    row = database_cursor.execute("SELECT value FROM METADATA WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def set_metadata(database_cursor, key, value):
+    database_cursor.execute(
+        "INSERT INTO METADATA (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+        (key, value)
+    )
+
+"""
+Upsert the nodes of a seeded prompt, matching the existing nodes by their position in the prompt's subprompts
+
+- Nodes that changed are updated and new nodes are appended, nodes added through the API are left untouched
+"""
+def seed_prompt_nodes(database_cursor, prompt_id, subprompts):
+    existing_nodes = {
+        row["seed_position"]: row for row in database_cursor.execute(
+            "SELECT node_id, seed_position, name, action FROM NODES WHERE prompt_id = ? AND seed_position IS NOT NULL",
+            (prompt_id,)
+        ).fetchall()
+    }
+    nodes_changed = False
+    for position, subprompt in enumerate(subprompts):
+        existing_node = existing_nodes.get(position)
+        if existing_node is None:
+            database_cursor.execute(
+                "INSERT INTO NODES (prompt_id, name, action, seed_position) VALUES (?, ?, ?, ?)",
+                (prompt_id, subprompt.get("name"), subprompt.get("action"), position)
             )
-        ''')
-    
-        database_cursor.execute('''
-            CREATE TABLE IF NOT EXISTS NOTES (
-                note_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                prompt_id INTEGER NOT NULL,
-                content TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (prompt_id) REFERENCES PROMPTS(prompt_id) ON DELETE CASCADE
+            nodes_changed = True
+        elif (existing_node["name"], existing_node["action"]) != (subprompt.get("name"), subprompt.get("action")):
+            database_cursor.execute(
+                "UPDATE NODES SET name = ?, action = ? WHERE node_id = ?",
+                (subprompt.get("name"), subprompt.get("action"), existing_node["node_id"])
             )
-        ''')
-    
-        # Load JSON data
-        json_path = os.path.join(os.path.dirname(__file__), PROMPT_FILE)
-        json_path = os.path.abspath(json_path)
+            nodes_changed = True
+    if nodes_changed:
+        database_cursor.execute("UPDATE PROMPTS SET version = version + 1 WHERE prompt_id = ?", (prompt_id,))
 
-        if not os.path.exists(json_path):
-            raise FileNotFoundError(f"Could not find prompt_list.json. Path provided: {json_path}")
-    
-        with open(json_path, "r") as f:
-            json_data = json.load(f)
-    
-        # Insert project
-        # As per the shared JSON file, there is only one project at the top level
-        # For multiple projects, this logic would need to be adjusted as per the JSON structure
+"""
+Match the prompts and nodes of a project seeded before seed tracking to the seed file, by their order
+
+- The seeded prompts are the first prompts of the chain and the seeded nodes of a prompt are its first nodes, as the rows added through
+  the API were appended after them
+- This only runs while no prompt of the project has a seed_id, so the rows added through the API are never matched afterwards
+"""
+def backfill_seed_ids(database_cursor, project_id, prompts):
+    if database_cursor.execute("SELECT 1 FROM PROMPTS WHERE project_id = ? AND seed_id IS NOT NULL LIMIT 1", (project_id,)).fetchone():
+        return
+    prompt_rows = database_cursor.execute(CHAIN_PROMPTS_QUERY.format(columns=CHAIN_PROMPT_ID_COLUMNS), (project_id,)).fetchall()
+    for position, (prompt_row, prompt_data) in enumerate(zip(prompt_rows, prompts)):
         database_cursor.execute(
-            "INSERT INTO PROJECTS (name, main_request, final_integration) VALUES (?, ?, ?)",
-            (json_data.get("project"), json_data.get("mainRequest"), json_data.get("finalIntegration"))
+            "UPDATE PROMPTS SET seed_id = ? WHERE prompt_id = ?",
+            (prompt_data.get("id", position + 1), prompt_row["prompt_id"])
         )
+        node_rows = database_cursor.execute(
+            "SELECT node_id FROM NODES WHERE prompt_id = ? ORDER BY node_id LIMIT ?",
+            (prompt_row["prompt_id"], len(prompt_data.get("subprompts", [])))
+        ).fetchall()
+        database_cursor.executemany(
+            "UPDATE NODES SET seed_position = ? WHERE node_id = ?",
+            [(node_position, node_row["node_id"]) for node_position, node_row in enumerate(node_rows)]
+        )
+
+"""
+Import the seed file into the database, only writing the rows that differ from the previous import
+
+- The file is hashed and the import is skipped when the hash matches the last imported seed file
+- The seeded project is created on the first import, and its prompts are matched by the id in the seed file
+- A seeded project adopted from a database created before seed tracking has its prompts and nodes matched by their order first
+- Prompts that changed are updated and new prompts are appended to the end of the chain
+- Nothing is deleted, so the prompts, nodes and notes added through the API are kept across restarts
+"""
+def seed_db(database_connection, json_path):
+    with open(json_path, "rb") as f:
+        seed_bytes = f.read()
+    seed_hash = hashlib.sha256(seed_bytes).hexdigest()
+
+    database_cursor = database_connection.cursor()
+    if get_metadata(database_cursor, "seed_hash") == seed_hash:
+        print("Seed file is unchanged, skipping the import")
+        return False
 
-        # Get the inserted project ID from the last inserted row
-        # This is not the most efficient way, and I would use UUID for IDs in a production system
-        # This pattern is used here for simplicity and also has been replicated in other parts of the codebase
-        project_row_id = database_cursor.lastrowid
-        project_id = database_cursor.execute(
-            "SELECT project_id FROM PROJECTS WHERE rowid = ?",
-            (project_row_id,)
-        ).fetchone()[0]
-
-        # Insert prompts and nodes
-        last_prompt_id = None
-        for prompt_data in json_data["prompts"]:
-            # The id provided for each prompt in the JSON file is not used for the database, as it might not be unique always
-            # I have used an auto-incrementing primary key for the prompt_id in the database.
+    json_data = json.loads(seed_bytes)
+    database_connection.execute("BEGIN")
+    try:
+        # As per the shared JSON file, there is only one project at the top level
+        project_id = get_metadata(database_cursor, "seed_project_id")
+        project_row = None
+        if project_id is not None:
+            project_row = database_cursor.execute("SELECT project_id FROM PROJECTS WHERE project_id = ?", (int(project_id),)).fetchone()
+        if project_row:
+            project_id = project_row["project_id"]
+            database_cursor.execute(
+                "UPDATE PROJECTS SET name = ?, main_request = ?, final_integration = ?, version = version + 1 WHERE project_id = ?",
+                (json_data.get("project"), json_data.get("mainRequest"), json_data.get("finalIntegration"), project_id)
+            )
+            backfill_seed_ids(database_cursor, project_id, json_data["prompts"])
+        else:
             database_cursor.execute(
-                "INSERT INTO PROMPTS (title, description, parent_prompt_id, project_id) VALUES (?, ?, ?, ?)",
-                (prompt_data.get("title"), prompt_data.get("description"), last_prompt_id, project_id)
+                "INSERT INTO PROJECTS (name, main_request, final_integration) VALUES (?, ?, ?)",
+                (json_data.get("project"), json_data.get("mainRequest"), json_data.get("finalIntegration"))
             )
+            # The project ID is an INTEGER PRIMARY KEY, which is an alias of the rowid, so lastrowid is the new project ID
+            project_id = database_cursor.lastrowid
+            set_metadata(database_cursor, "seed_project_id", str(project_id))
 
-            db_prompt_row_id = database_cursor.lastrowid
-            db_prompt_id = database_cursor.execute(
-                "SELECT prompt_id FROM PROMPTS WHERE rowid = ?",
-                (db_prompt_row_id,)
-            ).fetchone()[0]
-        
-            # Insert subprompts (nodes)
-            for subprompt in prompt_data.get("subprompts", []):
+        existing_prompts = {
+            row["seed_id"]: row for row in database_cursor.execute(
+                "SELECT prompt_id, seed_id, title, description FROM PROMPTS WHERE project_id = ? AND seed_id IS NOT NULL",
+                (project_id,)
+            ).fetchall()
+        }
+        # New prompts are appended to the last prompt of the chain, which is the prompt without a child prompt
+        tail_row = database_cursor.execute(
+            """
+            SELECT prompt_id FROM PROMPTS
+            WHERE project_id = ? AND NOT EXISTS (SELECT 1 FROM PROMPTS AS CHILD WHERE CHILD.parent_prompt_id = PROMPTS.prompt_id)
+            """,
+            (project_id,)
+        ).fetchone()
+        last_prompt_id = tail_row["prompt_id"] if tail_row else None
+
+        for position, prompt_data in enumerate(json_data["prompts"]):
+            # The id provided for each prompt in the JSON file is only used to match the seeded prompts across imports,
+            # the prompt_id in the database is still an auto-incrementing primary key
+            seed_id = prompt_data.get("id", position + 1)
+            existing_prompt = existing_prompts.get(seed_id)
+            if existing_prompt is None:
                 database_cursor.execute(
-                    "INSERT INTO NODES (prompt_id, name, action) VALUES (?, ?, ?)",
-                    (db_prompt_id, subprompt.get("name"), subprompt.get("action"))
+                    "INSERT INTO PROMPTS (title, description, parent_prompt_id, project_id, seed_id) VALUES (?, ?, ?, ?, ?)",
+                    (prompt_data.get("title"), prompt_data.get("description"), last_prompt_id, project_id, seed_id)
                 )
+                db_prompt_id = database_cursor.lastrowid
+                # Next prompt becomes a child of the current prompt (simple chain as the subprompts is provided as a simple list).
+                last_prompt_id = db_prompt_id
+            else:
+                db_prompt_id = existing_prompt["prompt_id"]
+                if (existing_prompt["title"], existing_prompt["description"]) != (prompt_data.get("title"), prompt_data.get("description")):
+                    database_cursor.execute(
+                        "UPDATE PROMPTS SET title = ?, description = ?, version = version + 1 WHERE prompt_id = ?",
+                        (prompt_data.get("title"), prompt_data.get("description"), db_prompt_id)
+                    )
+            seed_prompt_nodes(database_cursor, db_prompt_id, prompt_data.get("subprompts", []))
 
-            # Next prompt becomes a child of the current prompt (simple chain as the subprompts is provided as a simple list).
-            last_prompt_id = db_prompt_id
-
+        set_metadata(database_cursor, "seed_hash", seed_hash)
         database_connection.commit()
+    except Exception:
+        database_connection.rollback()
+        raise
+    return True
+
+"""
+Drop every table, so the next migration and seed start from a clean database
+"""
+def reset_db(database_connection):
+    for table in ("PROMPTS_FTS", "NODES_FTS", "NOTES_FTS", "CHANGES", "NOTES", "NODES", "PROMPTS", "PROJECTS", "METADATA", "SCHEMA_VERSION"):
+        database_connection.execute(f"DROP TABLE IF EXISTS {table}")
+    database_connection.commit()
+
+"""
+Initialize database referenced in DATABASE and load data from JSON file referenced in PROMPT_FILE and seed it into the database
+
+- The schema is migrated to the latest version and the seed file is imported incrementally, so existing data is kept
+- With reset=True every table is dropped first, which reloads the database from the seed file only
+"""
+def init_db(reset=False):
+    try:
+        database_connection = get_db_connection()
+        if reset:
+            reset_db(database_connection)
+
+        schema_version = migrate_db(database_connection)
+
+        # Load JSON data
+        json_path = os.path.join(os.path.dirname(__file__), PROMPT_FILE)
+        json_path = os.path.abspath(json_path)
+
+        if not os.path.exists(json_path):
+            raise FileNotFoundError(f"Could not find prompt_list.json. Path provided: {json_path}")
+
+        seed_db(database_connection, json_path)
         database_connection.close()
 
-        print("Database initialized successfully!")
+        print(f"Database initialized successfully at schema version {schema_version}!")
     except Exception as e:
         print(f"Error initializing database: {e}")
 
 """
 Get a database connection for the SQLite database referenced in DATABASE
+
+- This opens a standalone connection for scripts, the API server uses the pooled connections from connection_pool instead
 """
 def get_db_connection():
     try:
-        database_connection = sqlite3.connect(DATABASE)
-        # This helps to return rows as dictionaries instead of tuples
-        database_connection.row_factory = sqlite3.Row
-        # Enable foreign key support, which is disabled by default in SQLite
-        database_connection.execute('PRAGMA foreign_keys = ON')
-        return database_connection
+        return open_connection(DATABASE)
     except Exception as e:
         print(f"Error connecting to database: {e}")
         return None
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    init_db(reset="--reset" in sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,41 @@
+import json
+
+# orjson is an optional dependency, the standard library encoder is used when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+Encode a value as compact JSON bytes, with orjson when it is installed
+"""
+if orjson is not None:
+    def dumps(value):
+        return orjson.dumps(value)
+else:
+    def dumps(value):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+"""
+Encode the response envelope directly as bytes
+
+- body is a dict of fields encoded with dumps, and encoded_fields is a dict of fields whose values are already encoded as JSON
+- This lets large lists, such as the JSON of every row built by SQLite, be written into the envelope without decoding them into Python objects
+"""
+def encode_envelope(response_code, response_message, body=None, encoded_fields=None):
+    envelope = {"responseCode": response_code, "responseMessage": response_message}
+    if body:
+        envelope.update(body)
+    if not encoded_fields:
+        return dumps(envelope)
+    parts = [dumps(envelope)[:-1]]
+    for key, value in encoded_fields.items():
+        parts.append(b"," + dumps(key) + b":" + (value.encode() if isinstance(value, str) else value))
+    parts.append(b"}")
+    return b"".join(parts)
+
+"""
+Encode a list of values that are already encoded as JSON into a JSON array
+"""
+def encode_array(encoded_values):
+    return "[" + ",".join(encoded_values) + "]"
@@ -0,0 +1,240 @@
+import bisect
+import contextvars
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Statements that take longer than SLOW_QUERY_MS milliseconds (including fetching their rows) are logged
+SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_MS", "100")) / 1000
+
+# Buckets of the latency histograms in seconds, of the response size histogram in bytes and of the write batch histogram in writes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+BATCH_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Route of the request handled by the current thread, which labels the SQL metrics ("" outside of a request)
+current_route = contextvars.ContextVar("current_route", default="")
+
+slow_query_logger = logging.getLogger("slow_queries")
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(label_names, label_values, extra=""):
+    labels = [f'{name}="{escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+"""
+Counter with labels, exposed in the Prometheus text format
+"""
+class Counter:
+    type = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{format_labels(self.label_names, label_values)} {value}" for label_values, value in sorted(values.items())]
+
+"""
+Histogram with labels, exposed in the Prometheus text format
+
+- Every observation is counted in the first bucket whose upper bound is at least the value, and the buckets are made cumulative when collected
+"""
+class Histogram:
+    type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        bucket_index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(label_values, (None, 0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[bucket_index] += 1
+            self._values[label_values] = (counts, total + value)
+
+    def collect(self):
+        with self._lock:
+            values = {label_values: (list(counts), total) for label_values, (counts, total) in self._values.items()}
+        lines = []
+        for label_values, (counts, total) in sorted(values.items()):
+            cumulative_count = 0
+            for upper_bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative_count += count
+                bucket_labels = format_labels(self.label_names, label_values, f'le="{upper_bound}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative_count}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, label_values)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, label_values)} {cumulative_count}")
+        return lines
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to handle a request, until the response is returned", ("route", "method", "status")
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Size of the response bodies (streamed responses are not included)", ("route", "method"), SIZE_BUCKETS
+)
+CONNECTION_ACQUIRE_DURATION = Histogram(
+    "db_connection_acquire_seconds", "Time to check a connection out of the pool, including opening a new connection", ("route",)
+)
+CONNECTION_OPEN_DURATION = Histogram(
+    "db_connection_open_seconds", "Time to open a new connection and apply its PRAGMAs"
+)
+QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Time to execute a statement, until its first row is available", ("route", "operation")
+)
+FETCH_DURATION = Counter(
+    "db_fetch_seconds_total", "Time spent fetching the rows of the statements", ("route", "operation")
+)
+QUERY_ROWS = Counter(
+    "db_query_rows_total", "Rows fetched by the queries and changed by the other statements", ("route", "operation")
+)
+SLOW_QUERIES = Counter(
+    "db_slow_queries_total", "Statements that took longer than the slow query threshold", ("route", "operation")
+)
+COMMIT_DURATION = Histogram(
+    "db_commit_duration_seconds", "Time to commit a transaction", ("route",)
+)
+ENCODE_DURATION = Histogram(
+    "json_encode_duration_seconds", "Time to encode the JSON of a response", ("route",)
+)
+WRITE_BATCH_WRITES = Histogram(
+    "db_write_batch_writes", "Writes committed together by the write queue in a single transaction", buckets=BATCH_BUCKETS
+)
+WRITE_QUEUE_DURATION = Histogram(
+    "db_write_queue_seconds", "Time a write waits in the write queue until its batch starts"
+)
+METRICS = (
+    REQUEST_DURATION, RESPONSE_SIZE, CONNECTION_ACQUIRE_DURATION, CONNECTION_OPEN_DURATION, QUERY_DURATION,
+    FETCH_DURATION, QUERY_ROWS, SLOW_QUERIES, COMMIT_DURATION, ENCODE_DURATION, WRITE_BATCH_WRITES, WRITE_QUEUE_DURATION,
+)
+
+"""
+Render every metric in the Prometheus text format, followed by the extra metrics given as (name, type, documentation, value)
+"""
+def render_metrics(extra_metrics=()):
+    lines = []
+    for metric in METRICS:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.collect())
+    for name, metric_type, documentation, value in extra_metrics:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+def get_operation(sql):
+    words = sql.split(None, 1)
+    return words[0].upper() if words else ""
+
+"""
+Cursor that records the execution time and row count of every statement
+
+- The execution time covers execute, which runs the statement until its first row, and the fetch time is recorded separately
+- The rows are counted when they are fetched, and for the statements that change rows, from rowcount
+- A statement is logged once when its execution and fetch time reaches the slow query threshold
+- Rows read by iterating over the cursor are not counted, as every query of the app uses the fetch methods
+"""
+class InstrumentedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started_at = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self.record_statement(sql, time.perf_counter() - started_at)
+
+    def executemany(self, sql, seq_of_parameters):
+        started_at = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self.record_statement(sql, time.perf_counter() - started_at)
+
+    def fetchone(self):
+        started_at = time.perf_counter()
+        row = super().fetchone()
+        self.record_fetch(time.perf_counter() - started_at, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started_at = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self.record_fetch(time.perf_counter() - started_at, len(rows))
+        return rows
+
+    def fetchall(self):
+        started_at = time.perf_counter()
+        rows = super().fetchall()
+        self.record_fetch(time.perf_counter() - started_at, len(rows))
+        return rows
+
+    def record_statement(self, sql, seconds):
+        self.statement = sql
+        self.labels = (current_route.get(), get_operation(sql))
+        self.statement_seconds = seconds
+        self.statement_rows = max(self.rowcount, 0)
+        self.slow_query_logged = False
+        QUERY_DURATION.observe(seconds, *self.labels)
+        if self.statement_rows:
+            QUERY_ROWS.inc(self.statement_rows, *self.labels)
+        self.check_slow_query()
+
+    def record_fetch(self, seconds, row_count):
+        if not hasattr(self, "labels"):
+            return
+        self.statement_seconds += seconds
+        self.statement_rows += row_count
+        FETCH_DURATION.inc(seconds, *self.labels)
+        if row_count:
+            QUERY_ROWS.inc(row_count, *self.labels)
+        self.check_slow_query()
+
+    def check_slow_query(self):
+        if self.slow_query_logged or self.statement_seconds < SLOW_QUERY_SECONDS:
+            return
+        self.slow_query_logged = True
+        SLOW_QUERIES.inc(1, *self.labels)
+        slow_query_logger.warning(
+            "Slow query on %s (%.1f ms, %d rows so far): %s",
+            self.labels[0] or "no route", self.statement_seconds * 1000, self.statement_rows, " ".join(self.statement.split())
+        )
+
+"""
+Connection whose cursors are instrumented, including the cursors created by the execute shortcuts, and which records the commit time
+"""
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started_at = time.perf_counter()
+        super().commit()
+        COMMIT_DURATION.observe(time.perf_counter() - started_at, current_route.get())
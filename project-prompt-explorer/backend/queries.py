@@ -0,0 +1,122 @@
+# SQL of the API endpoints in app.py
+# The endpoints and query_plans.py use the same constants, so the query plan check always describes the queries the endpoints run
+# Queries with a {placeholder} are templates, which are formatted with one of the values listed next to them
+
+# Projects
+FIRST_PROJECT_QUERY = "SELECT project_id FROM PROJECTS ORDER BY project_id LIMIT 1"
+PROJECT_QUERY = "SELECT * FROM PROJECTS WHERE project_id = ?"
+PROJECT_EXISTS_QUERY = "SELECT project_id FROM PROJECTS WHERE project_id = ?"
+# A project with an empty name is being imported into its own database file and is listed once the import is done
+PROJECTS_QUERY = "SELECT project_id, name, main_request, final_integration FROM PROJECTS WHERE name != '' ORDER BY project_id"
+
+# Prompts
+PROMPT_QUERY = "SELECT * FROM PROMPTS WHERE prompt_id = ?"
+PROMPT_VERSION_QUERY = "SELECT prompt_id, version FROM PROMPTS WHERE prompt_id = ?"
+PROMPT_EXISTS_QUERY = "SELECT prompt_id FROM PROMPTS WHERE prompt_id = ?"
+PROMPT_PROJECT_QUERY = "SELECT prompt_id, project_id FROM PROMPTS WHERE prompt_id = ?"
+CHILD_PROMPT_QUERY = "SELECT prompt_id FROM PROMPTS WHERE parent_prompt_id = ?"
+
+# Prompts of a project in chain order, walked from the root prompt through the child of each prompt
+# - {columns} is one of the CHAIN_PROMPT_*_COLUMNS, or the prompt columns of an export
+CHAIN_PROMPTS_QUERY = """
+    WITH RECURSIVE CHAIN (prompt_id, root_id, depth) AS (
+        SELECT prompt_id, prompt_id, 0 FROM PROMPTS WHERE project_id = ? AND parent_prompt_id IS NULL
+        UNION ALL
+        SELECT PROMPTS.prompt_id, CHAIN.root_id, CHAIN.depth + 1
+        FROM CHAIN JOIN PROMPTS ON PROMPTS.parent_prompt_id = CHAIN.prompt_id
+    )
+    SELECT {columns} FROM CHAIN JOIN PROMPTS ON PROMPTS.prompt_id = CHAIN.prompt_id
+    ORDER BY CHAIN.root_id, CHAIN.depth
+"""
+CHAIN_PROMPT_ID_COLUMNS = "PROMPTS.prompt_id"
+CHAIN_PROMPT_DETAIL_COLUMNS = "PROMPTS.prompt_id, PROMPTS.title, PROMPTS.description, PROMPTS.parent_prompt_id, PROMPTS.project_id"
+
+# Nodes of every prompt of a project, for the expanded tree
+TREE_NODES_QUERY = """
+    SELECT NODES.prompt_id, NODES.name, NODES.action
+    FROM NODES
+    JOIN PROMPTS ON PROMPTS.prompt_id = NODES.prompt_id
+    WHERE PROMPTS.project_id = ?
+    ORDER BY PROMPTS.prompt_id, NODES.node_id
+"""
+
+# Ancestors or descendants of a prompt, with their distance from the prompt
+# - {step} is the join condition of each step of the walk, one of the values of CHAIN_DIRECTIONS
+# - Ancestors follow parent_prompt_id through the primary key
+# - Descendants look the child up with the unique index on parent_prompt_id
+PROMPT_CHAIN_QUERY = """
+    WITH RECURSIVE CHAIN (prompt_id, parent_prompt_id, depth) AS (
+        SELECT prompt_id, parent_prompt_id, 0 FROM PROMPTS WHERE prompt_id = :prompt_id
+        UNION ALL
+        SELECT PROMPTS.prompt_id, PROMPTS.parent_prompt_id, CHAIN.depth + 1
+        FROM CHAIN JOIN PROMPTS ON {step}
+        WHERE :max_depth IS NULL OR CHAIN.depth < :max_depth
+    )
+    SELECT PROMPTS.prompt_id, PROMPTS.title, PROMPTS.description, PROMPTS.parent_prompt_id, PROMPTS.project_id, CHAIN.depth
+    FROM CHAIN JOIN PROMPTS ON PROMPTS.prompt_id = CHAIN.prompt_id
+    ORDER BY CHAIN.depth
+"""
+CHAIN_DIRECTIONS = {
+    "ancestors": "PROMPTS.prompt_id = CHAIN.parent_prompt_id",
+    "descendants": "PROMPTS.parent_prompt_id = CHAIN.prompt_id",
+}
+
+# Nodes of a prompt, where the JSON of the nodes is built by SQLite
+# - The page query returns one row per node (with its ID for the cursor) and the list query aggregates every node into a JSON array
+NODES_PAGE_QUERY = "SELECT node_id, json_object('name', name, 'action', action) FROM NODES WHERE prompt_id = ? AND node_id > ? ORDER BY node_id"
+NODES_LIST_QUERY = "SELECT json_group_array(json_object('name', name, 'action', action)) FROM (SELECT name, action FROM NODES WHERE prompt_id = ? AND node_id > ? ORDER BY node_id)"
+
+# Notes of a prompt, newest first, where the JSON of the notes is built by SQLite
+# - {where} is NOTES_WHERE, or NOTES_AFTER_WHERE for the notes after a cursor
+NOTES_WHERE = "WHERE prompt_id = ?"
+NOTES_AFTER_WHERE = "WHERE prompt_id = ? AND (created_at, note_id) < (?, ?)"
+NOTES_PAGE_QUERY = "SELECT note_id, created_at, json_object('id', note_id, 'content', content, 'createdAt', created_at) FROM NOTES {where} ORDER BY created_at DESC, note_id DESC"
+NOTES_LIST_QUERY = "SELECT json_group_array(json_object('id', note_id, 'content', content, 'createdAt', created_at)) FROM (SELECT note_id, content, created_at FROM NOTES {where} ORDER BY created_at DESC, note_id DESC)"
+
+# Writes of the prompt, node and note endpoints
+INSERT_PROMPT_QUERY = "INSERT INTO PROMPTS (title, description, parent_prompt_id, project_id) VALUES (?, ?, ?, ?)"
+INSERT_NODE_QUERY = "INSERT INTO NODES (prompt_id, name, action) VALUES (?, ?, ?)"
+INSERT_NOTE_QUERY = "INSERT INTO NOTES (prompt_id, content) VALUES (?, ?)"
+BUMP_PROJECT_VERSION_QUERY = "UPDATE PROJECTS SET version = version + 1 WHERE project_id = ?"
+BUMP_PROMPT_VERSION_QUERY = "UPDATE PROMPTS SET version = version + 1 WHERE prompt_id = ?"
+BUMP_PROMPT_PROJECT_VERSION_QUERY = "UPDATE PROJECTS SET version = version + 1 WHERE project_id = (SELECT project_id FROM PROMPTS WHERE prompt_id = ?)"
+
+# Best matches of the search query in each FTS table, merged by score
+SEARCH_QUERY = """
+    SELECT * FROM (
+        SELECT 'prompt' AS type, rowid AS id, rowid AS prompt_id, snippet(PROMPTS_FTS, -1, '<mark>', '</mark>', '…', 16) AS snippet, rank AS score
+        FROM PROMPTS_FTS WHERE PROMPTS_FTS MATCH ? ORDER BY rank LIMIT ?
+    )
+    UNION ALL
+    SELECT * FROM (
+        SELECT 'node', NODES_FTS.rowid, NODES.prompt_id, snippet(NODES_FTS, -1, '<mark>', '</mark>', '…', 16), NODES_FTS.rank
+        FROM NODES_FTS JOIN NODES ON NODES.node_id = NODES_FTS.rowid WHERE NODES_FTS MATCH ? ORDER BY NODES_FTS.rank LIMIT ?
+    )
+    UNION ALL
+    SELECT * FROM (
+        SELECT 'note', NOTES_FTS.rowid, NOTES.prompt_id, snippet(NOTES_FTS, -1, '<mark>', '</mark>', '…', 16), NOTES_FTS.rank
+        FROM NOTES_FTS JOIN NOTES ON NOTES.note_id = NOTES_FTS.rowid WHERE NOTES_FTS MATCH ? ORDER BY NOTES_FTS.rank LIMIT ?
+    )
+    ORDER BY score LIMIT ?
+"""
+
+# SQL of the export, where the JSON of every row is built by SQLite
+# - The prompt entry is the columns of CHAIN_PROMPTS_QUERY, as the prompts are read in chain order
+# - In the NDJSON export every line is one row, with its type
+# - In the prompt_list export every prompt embeds its nodes as subprompts and its notes, which is the prompt_list.json shape
+EXPORT_QUERIES = {
+    "ndjson": {
+        "project": "SELECT json_object('type', 'project', 'id', project_id, 'project', name, 'mainRequest', main_request, 'finalIntegration', final_integration) FROM PROJECTS WHERE project_id = ?",
+        "prompt": "PROMPTS.prompt_id, json_object('type', 'prompt', 'id', PROMPTS.prompt_id, 'title', PROMPTS.title, 'description', PROMPTS.description, 'parentPromptId', PROMPTS.parent_prompt_id)",
+        "nodes": "SELECT json_object('type', 'node', 'id', node_id, 'promptId', prompt_id, 'name', name, 'action', action) FROM NODES WHERE prompt_id = ? ORDER BY node_id",
+        "notes": "SELECT json_object('type', 'note', 'id', note_id, 'promptId', prompt_id, 'content', content, 'createdAt', created_at) FROM NOTES WHERE prompt_id = ? ORDER BY created_at, note_id",
+    },
+    "prompt_list": {
+        "project": "SELECT json_object('project', name, 'mainRequest', main_request, 'finalIntegration', final_integration) FROM PROJECTS WHERE project_id = ?",
+        "prompt": """PROMPTS.prompt_id, json_object(
+            'id', PROMPTS.prompt_id, 'title', PROMPTS.title, 'description', PROMPTS.description,
+            'subprompts', json((SELECT json_group_array(json_object('name', name, 'action', action)) FROM (SELECT name, action FROM NODES WHERE prompt_id = PROMPTS.prompt_id ORDER BY node_id))),
+            'notes', json((SELECT json_group_array(json_object('content', content, 'createdAt', created_at)) FROM (SELECT content, created_at FROM NOTES WHERE prompt_id = PROMPTS.prompt_id ORDER BY created_at, note_id)))
+        )""",
+    },
+}
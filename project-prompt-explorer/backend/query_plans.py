@@ -0,0 +1,112 @@
+import sqlite3
+import sys
+
+from change_feed import CHANGE_QUERIES, CHANGES_AFTER_QUERY, LAST_CHANGE_QUERY, PRUNE_CHANGES_QUERY
+from init_db import migrate_db
+from queries import (
+    BUMP_PROMPT_PROJECT_VERSION_QUERY, CHAIN_DIRECTIONS, CHAIN_PROMPT_DETAIL_COLUMNS, CHAIN_PROMPT_ID_COLUMNS, CHAIN_PROMPTS_QUERY, CHILD_PROMPT_QUERY, EXPORT_QUERIES,
+    FIRST_PROJECT_QUERY, NODES_LIST_QUERY, NODES_PAGE_QUERY, NOTES_AFTER_WHERE, NOTES_LIST_QUERY, NOTES_PAGE_QUERY, NOTES_WHERE,
+    PROJECT_EXISTS_QUERY, PROJECT_QUERY, PROJECTS_QUERY, PROMPT_CHAIN_QUERY, PROMPT_EXISTS_QUERY, PROMPT_PROJECT_QUERY, PROMPT_QUERY,
+    PROMPT_VERSION_QUERY, SEARCH_QUERY, TREE_NODES_QUERY
+)
+from shard_router import PROJECT_SHARD_QUERY, PROJECT_SHARDS_QUERY
+
+# The queries issued by the API endpoints, built from the same constants as the endpoints, with sample parameters
+# ALLOWED_STEPS lists the unindexed steps that only read or sort a bounded number of rows, which are expected
+ENDPOINT_QUERIES = {
+    "GET /tree (first project)": (FIRST_PROJECT_QUERY, ()),
+    "GET /projects/:id/tree (project)": (PROJECT_QUERY, (1,)),
+    "Project exists": (PROJECT_EXISTS_QUERY, (1,)),
+    "GET /projects": (PROJECTS_QUERY, ()),
+    "Shard of a project": (PROJECT_SHARD_QUERY, (1,)),
+    "Shards of every project": (PROJECT_SHARDS_QUERY, ()),
+    "GET /tree (prompt IDs in chain order)": (CHAIN_PROMPTS_QUERY.format(columns=CHAIN_PROMPT_ID_COLUMNS), (1,)),
+    "GET /tree?expand=prompts (prompts in chain order)": (CHAIN_PROMPTS_QUERY.format(columns=CHAIN_PROMPT_DETAIL_COLUMNS), (1,)),
+    "GET /tree?expand=nodes": (TREE_NODES_QUERY, (1,)),
+    "GET /prompts/:id": (PROMPT_QUERY, (1,)),
+    "Prompt version": (PROMPT_VERSION_QUERY, (1,)),
+    "Prompt exists": (PROMPT_EXISTS_QUERY, (1,)),
+    "GET /prompts/:id/nodes": (NODES_PAGE_QUERY + " LIMIT ?", (1, 0, 100)),
+    "GET /prompts/:id/nodes (full list)": (NODES_LIST_QUERY, (1, 0)),
+    "GET /prompts/:id/notes": (NOTES_PAGE_QUERY.format(where=NOTES_WHERE) + " LIMIT ?", (1, 100)),
+    "GET /prompts/:id/notes?after=": (NOTES_PAGE_QUERY.format(where=NOTES_AFTER_WHERE) + " LIMIT ?", (1, "2024-01-01 00:00:00", 10, 100)),
+    "GET /prompts/:id/notes (full list)": (NOTES_LIST_QUERY.format(where=NOTES_WHERE), (1,)),
+    "GET /search": (SEARCH_QUERY, ('"track"*', 21, '"track"*', 21, '"track"*', 21, 21)),
+    "GET /prompts/:id/ancestors": (PROMPT_CHAIN_QUERY.format(step=CHAIN_DIRECTIONS["ancestors"]), {"prompt_id": 1, "max_depth": 10}),
+    "GET /prompts/:id/descendants": (PROMPT_CHAIN_QUERY.format(step=CHAIN_DIRECTIONS["descendants"]), {"prompt_id": 1, "max_depth": 10}),
+    "POST /prompts/:id (parent)": (PROMPT_PROJECT_QUERY, (1,)),
+    "POST /prompts/:id (child)": (CHILD_PROMPT_QUERY, (1,)),
+    "POST /prompts/:id/nodes (project version)": (BUMP_PROMPT_PROJECT_VERSION_QUERY, (1,)),
+    "Change log (new prompts)": (CHANGE_QUERIES["prompt"], ("[1]",)),
+    "Change log (new nodes)": (CHANGE_QUERIES["node"], ("[1, 2]",)),
+    "Change log (new notes)": (CHANGE_QUERIES["note"], ("[1, 2]",)),
+    "Change log (last change)": (LAST_CHANGE_QUERY, ()),
+    "Change log (prune)": (PRUNE_CHANGES_QUERY, (100000,)),
+    "GET /prompts/:id/events": (CHANGES_AFTER_QUERY.format(column="prompt_id"), (1, 0, 500)),
+    "GET /projects/:id/events": (CHANGES_AFTER_QUERY.format(column="project_id"), (1, 0, 500)),
+}
+# The export reads the project, the prompts in chain order and (in NDJSON) the nodes and notes of every prompt
+for export_format, export_queries in EXPORT_QUERIES.items():
+    ENDPOINT_QUERIES[f"GET /projects/:id/export?format={export_format} (project)"] = (export_queries["project"], (1,))
+    ENDPOINT_QUERIES[f"GET /projects/:id/export?format={export_format} (prompts)"] = (CHAIN_PROMPTS_QUERY.format(columns=export_queries["prompt"]), (1,))
+    for rows in ("nodes", "notes"):
+        if rows in export_queries:
+            ENDPOINT_QUERIES[f"GET /projects/:id/export?format={export_format} ({rows})"] = (export_queries[rows], (1,))
+
+CHAIN_WALK_STEPS = {"SCAN CHAIN", "USE TEMP B-TREE FOR ORDER BY"}
+ALLOWED_STEPS = {
+    # Reads the first project only
+    "GET /tree (first project)": {"SCAN PROJECTS"},
+    # Reads every project in the catalog, which has one row per project
+    "GET /projects": {"SCAN PROJECTS"},
+    "Shards of every project": {"SCAN PROJECTS"},
+    # Sorts the best offset + limit matches of each FTS table
+    "GET /search": {"USE TEMP B-TREE FOR ORDER BY"},
+    # Reads the rows of the recursive CTE, each of which was found with an index, and sorts them by depth
+    "GET /tree (prompt IDs in chain order)": CHAIN_WALK_STEPS,
+    "GET /tree?expand=prompts (prompts in chain order)": CHAIN_WALK_STEPS,
+    "GET /prompts/:id/ancestors": CHAIN_WALK_STEPS,
+    "GET /prompts/:id/descendants": CHAIN_WALK_STEPS,
+    **{f"GET /projects/:id/export?format={export_format} (prompts)": CHAIN_WALK_STEPS for export_format in EXPORT_QUERIES},
+}
+
+"""
+Get the steps of the query plan that read a table without an index or sort the rows in a temporary B-tree
+
+- Scanning the rows of a subquery is not reported, as the subquery itself has its own steps in the plan
+- Scanning an FTS table with a MATCH constraint is not reported either, as it reads the full-text index
+"""
+def find_unindexed_steps(database_connection, query, params):
+    plan_rows = database_connection.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    return [
+        row[3] for row in plan_rows
+        if (
+            row[3].startswith("SCAN")
+            and "USING" not in row[3]
+            and "VIRTUAL TABLE INDEX" not in row[3]
+            and not row[3].startswith("SCAN (subquery")
+        ) or "TEMP B-TREE" in row[3]
+    ]
+
+"""
+Check that every endpoint query uses an index, using an empty in-memory database with the current schema
+
+- Prints the offending query plan steps and returns False if any query scans a table or sorts without an index
+"""
+def check_query_plans():
+    database_connection = sqlite3.connect(":memory:")
+    migrate_db(database_connection)
+    all_indexed = True
+    for endpoint, (query, params) in ENDPOINT_QUERIES.items():
+        allowed_steps = ALLOWED_STEPS.get(endpoint, set())
+        unindexed_steps = [step for step in find_unindexed_steps(database_connection, query, params) if step not in allowed_steps]
+        if unindexed_steps:
+            all_indexed = False
+            print(f"{endpoint} does not use an index: {'; '.join(unindexed_steps)}")
+    database_connection.close()
+    return all_indexed
+
+if __name__ == "__main__":
+    if not check_query_plans():
+        sys.exit(1)
+    print("All endpoint queries use an index")
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "local")
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "60"))
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+"""
+Interface of the response cache backends
+
+- Values are the serialized responses as bytes, so they can be stored in a cache shared between worker processes
+- get returns None on a miss, and a backend that fails must behave like a miss instead of failing the request
+"""
+class CacheBackend:
+    name = None
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value):
+        raise NotImplementedError
+
+    def delete(self, *keys):
+        raise NotImplementedError
+
+    def stats(self):
+        raise NotImplementedError
+
+"""
+Cache backend that doesn't store anything, used when the cache is disabled
+"""
+class NullCache(CacheBackend):
+    name = "none"
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def stats(self):
+        return {"backend": self.name}
+
+"""
+In-process cache bounded by the number of entries (least recently used entries are evicted first) and by a TTL
+
+- This is the default backend, and each worker process has its own cache
+- Expired entries are dropped when they are read, and are counted as misses
+"""
+class LocalCache(CacheBackend):
+    name = "local"
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.name,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+"""
+Cache backend shared between worker processes, stored in Redis with the TTL set on every key
+
+- The redis package is only required when this backend is selected
+- Hits and misses are counted per process, and evictions are the keys evicted by the Redis server
+"""
+class RedisCache(CacheBackend):
+    name = "redis"
+
+    def __init__(self, url=CACHE_REDIS_URL, ttl=CACHE_TTL, prefix="prompt-explorer:"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            value = self.client.get(self.prefix + key)
+        except Exception as e:
+            print(f"Error reading from the response cache: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            self.client.set(self.prefix + key, value, px=int(self.ttl * 1000))
+        except Exception as e:
+            print(f"Error writing to the response cache: {e}")
+
+    def delete(self, *keys):
+        try:
+            self.client.delete(*[self.prefix + key for key in keys])
+        except Exception as e:
+            print(f"Error invalidating the response cache: {e}")
+
+    def stats(self):
+        try:
+            evictions = self.client.info("stats").get("evicted_keys")
+        except Exception:
+            evictions = None
+        return {
+            "backend": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": evictions
+        }
+
+"""
+Create the cache backend selected by CACHE_BACKEND (local, redis or none)
+"""
+def create_cache(backend=CACHE_BACKEND):
+    if backend == "local":
+        return LocalCache()
+    if backend == "redis":
+        return RedisCache()
+    if backend == "none":
+        return NullCache()
+    raise ValueError(f"Unknown cache backend: {backend}")
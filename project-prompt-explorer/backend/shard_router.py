@@ -0,0 +1,191 @@
+import os
+import threading
+
+from bulk_import import BATCH_SIZE, import_prompt_list
+from connection_pool import close_pool, get_pool, open_connection
+from init_db import migrate_db
+
+# With DB_SHARDING=project every new project is created in its own database file in SHARD_DIRECTORY,
+# so writes to different projects never wait for the same write lock
+# - The main database is the catalog of every project and still stores the projects created without sharding
+# - SHARD_DIRECTORY defaults to the shards directory next to the main database
+SHARDING = os.environ.get("DB_SHARDING") == "project"
+SHARD_DIRECTORY = os.environ.get("SHARD_DIRECTORY")
+
+# The prompts, nodes and notes of a sharded project get IDs from project_id * ID_STRIDE, so the database of a prompt
+# is found from its ID alone, and IDs stay unique across every database
+ID_STRIDE = 1_000_000_000
+SHARDED_TABLES = ("PROMPTS", "NODES", "NOTES")
+
+# Catalog queries of the main database
+PROJECT_SHARD_QUERY = "SELECT shard FROM PROJECTS WHERE project_id = ?"
+PROJECT_SHARDS_QUERY = "SELECT shard FROM PROJECTS WHERE shard IS NOT NULL ORDER BY project_id"
+
+"""
+Route projects and prompts to the database file that stores them
+
+- PROJECTS.shard in the main database is the file name of the project's database, or NULL if the project is stored in the main database
+- The database of a project is looked up once and kept in memory, as a project never moves to another database
+- A shard is opened lazily and migrated to the latest schema the first time this process uses it
+"""
+class ShardRouter:
+    def __init__(self, database, shard_directory=SHARD_DIRECTORY, sharding=SHARDING):
+        self.database = database
+        self.shard_directory = shard_directory or os.path.join(os.path.dirname(database), "shards")
+        self.sharding = sharding
+        self._project_shards = {}
+        self._migrated_shards = set()
+        self._lock = threading.Lock()
+
+    def open_shard(self, shard):
+        shard_path = os.path.join(self.shard_directory, shard)
+        if shard_path not in self._migrated_shards:
+            with self._lock:
+                if shard_path not in self._migrated_shards:
+                    database_connection = open_connection(shard_path)
+                    try:
+                        migrate_db(database_connection)
+                    finally:
+                        database_connection.close()
+                    self._migrated_shards.add(shard_path)
+        return shard_path
+
+    def query_catalog(self, query, params=()):
+        pool = get_pool(self.database)
+        database_connection = pool.acquire()
+        try:
+            return database_connection.execute(query, params).fetchall()
+        finally:
+            pool.release(database_connection)
+
+    """
+    Get the database file of a project, which is the main database for unknown projects so the caller reports them as not found
+    """
+    def get_project_database(self, project_id):
+        if project_id not in self._project_shards:
+            project_rows = self.query_catalog(PROJECT_SHARD_QUERY, (project_id,))
+            if not project_rows:
+                return self.database
+            self._project_shards[project_id] = project_rows[0]["shard"]
+        shard = self._project_shards[project_id]
+        return self.open_shard(shard) if shard else self.database
+
+    """
+    Get the database file of a prompt (or of one of its nodes or notes) from its ID
+    """
+    def get_prompt_database(self, prompt_id):
+        # IDs below ID_STRIDE are allocated by the main database
+        if prompt_id < ID_STRIDE:
+            return self.database
+        return self.get_project_database(prompt_id // ID_STRIDE)
+
+    """
+    Get every database file, starting with the main database, for the queries that read across projects
+    """
+    def get_databases(self):
+        shard_rows = self.query_catalog(PROJECT_SHARDS_QUERY)
+        return [self.database] + [self.open_shard(row["shard"]) for row in shard_rows]
+
+    """
+    Register a new project in the catalog and create its database file
+
+    - The project is listed once its import is published, until then its name in the catalog is empty
+    - The ID sequences of the new database start at project_id * ID_STRIDE
+    """
+    def create_project_database(self):
+        pool = get_pool(self.database)
+        database_connection = pool.acquire()
+        try:
+            database_cursor = database_connection.cursor()
+            database_cursor.execute("INSERT INTO PROJECTS (name) VALUES ('')")
+            project_id = database_cursor.lastrowid
+            shard = f"project_{project_id}.db"
+            database_cursor.execute("UPDATE PROJECTS SET shard = ? WHERE project_id = ?", (shard, project_id))
+            database_connection.commit()
+        finally:
+            pool.release(database_connection)
+
+        os.makedirs(self.shard_directory, exist_ok=True)
+        # Project IDs are never reused, so a file with the same name is left over from a database that was reset
+        remove_database_files(os.path.join(self.shard_directory, shard))
+        shard_path = self.open_shard(shard)
+        database_connection = open_connection(shard_path)
+        try:
+            database_connection.executemany(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                [(table, project_id * ID_STRIDE) for table in SHARDED_TABLES]
+            )
+            database_connection.commit()
+        finally:
+            database_connection.close()
+        self._project_shards[project_id] = shard
+        return project_id, shard_path
+
+    """
+    Copy the details of a project from its database into the catalog, which lists it
+    """
+    def publish_project(self, project_id, shard_path):
+        pool = get_pool(shard_path)
+        database_connection = pool.acquire()
+        try:
+            project_row = database_connection.execute(
+                "SELECT name, main_request, final_integration FROM PROJECTS WHERE project_id = ?",
+                (project_id,)
+            ).fetchone()
+        finally:
+            pool.release(database_connection)
+
+        pool = get_pool(self.database)
+        database_connection = pool.acquire()
+        try:
+            database_connection.execute(
+                "UPDATE PROJECTS SET name = ?, main_request = ?, final_integration = ? WHERE project_id = ?",
+                (project_row["name"], project_row["main_request"], project_row["final_integration"], project_id)
+            )
+            database_connection.commit()
+        finally:
+            pool.release(database_connection)
+
+    """
+    Remove a project that failed to be created from the catalog, and delete its database file
+    """
+    def drop_project_database(self, project_id, shard_path):
+        pool = get_pool(self.database)
+        database_connection = pool.acquire()
+        try:
+            database_connection.execute("DELETE FROM PROJECTS WHERE project_id = ?", (project_id,))
+            database_connection.commit()
+        finally:
+            pool.release(database_connection)
+        self._project_shards.pop(project_id, None)
+        close_pool(shard_path)
+        remove_database_files(shard_path)
+
+    """
+    Bulk import a prompt list file as a new project in its own database file
+
+    - The import itself is the same as for the main database, and only the catalog is written in the main database
+    - If the import fails, the project is removed from the catalog and its database file is deleted
+    """
+    def import_prompt_list(self, text_stream, batch_size=BATCH_SIZE, defer_indexes=False):
+        project_id, shard_path = self.create_project_database()
+        try:
+            pool = get_pool(shard_path)
+            database_connection = pool.acquire()
+            try:
+                stats = import_prompt_list(database_connection, text_stream, batch_size=batch_size, defer_indexes=defer_indexes, project_id=project_id)
+            finally:
+                pool.release(database_connection)
+            self.publish_project(project_id, shard_path)
+        except Exception:
+            self.drop_project_database(project_id, shard_path)
+            raise
+        return stats
+
+"""
+Delete a database file together with its WAL and shared memory files
+"""
+def remove_database_files(database):
+    for path in (database, f"{database}-wal", f"{database}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
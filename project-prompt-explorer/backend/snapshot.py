@@ -0,0 +1,100 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from connection_pool import open_connection
+
+# Snapshots made through the API are written to SNAPSHOT_DIRECTORY, which defaults to the snapshots directory next to the main database
+SNAPSHOT_DIRECTORY = os.environ.get("SNAPSHOT_DIRECTORY")
+
+_snapshot_lock = threading.Lock()
+
+"""
+Copy a live database into a new database file with SQLite's online backup API
+
+- The source is read in a single backup step, which is one read transaction, so the copy is a consistent snapshot
+  and writers are never blocked (in WAL mode readers and the writer don't wait for each other)
+- A backup done in several steps would restart whenever another connection writes between two steps, so it might never finish under a steady write load
+- The copy is written to a temporary file next to the target and renamed once complete, so the target is never a partial copy
+- Returns the size of the snapshot in bytes
+"""
+def backup_database(database, target_path):
+    temporary_path = f"{target_path}.tmp"
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+    source_connection = open_connection(database)
+    try:
+        target_connection = sqlite3.connect(temporary_path)
+        try:
+            source_connection.backup(target_connection)
+        finally:
+            target_connection.close()
+    finally:
+        source_connection.close()
+    os.replace(temporary_path, target_path)
+    return os.path.getsize(target_path)
+
+"""
+Snapshot the main database and the databases of the sharded projects into a new directory
+
+- The directory has the layout of the default data directory (the main database, and the project databases in shards/),
+  so it can be copied back or used as the data directory of another environment
+- The databases are snapshotted one after the other, so the snapshots of different databases can be a few moments apart
+- Only one snapshot runs at a time, and the directory must not exist yet
+- Returns the snapshot directory with the file, size and duration of every database snapshot
+"""
+def snapshot_databases(databases, snapshot_directory):
+    with _snapshot_lock:
+        started_at = time.perf_counter()
+        os.makedirs(snapshot_directory)
+        files = []
+        for index, database in enumerate(databases):
+            relative_path = os.path.basename(database) if index == 0 else os.path.join("shards", os.path.basename(database))
+            target_path = os.path.join(snapshot_directory, relative_path)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            database_started_at = time.perf_counter()
+            size = backup_database(database, target_path)
+            files.append({
+                "file": relative_path,
+                "bytes": size,
+                "seconds": round(time.perf_counter() - database_started_at, 3)
+            })
+        return {
+            "directory": snapshot_directory,
+            "files": files,
+            "seconds": round(time.perf_counter() - started_at, 3)
+        }
+
+"""
+Get the directory of a new snapshot of a main database, named after the current time
+"""
+def get_snapshot_directory(database, parent_directory=SNAPSHOT_DIRECTORY):
+    parent_directory = parent_directory or os.path.join(os.path.dirname(database), "snapshots")
+    return os.path.join(parent_directory, datetime.now(timezone.utc).strftime("snapshot-%Y%m%d-%H%M%S-%f"))
+
+if __name__ == "__main__":
+    from init_db import DATABASE
+    from shard_router import ShardRouter
+
+    parser = argparse.ArgumentParser(description="Snapshot the live databases with the SQLite online backup API")
+    parser.add_argument("directory", help="Directory of the snapshot, which must not exist")
+    arguments = parser.parse_args()
+
+    if not os.path.exists(DATABASE):
+        print(f"Error creating snapshot: {DATABASE} does not exist")
+        sys.exit(1)
+    if os.path.exists(arguments.directory):
+        print(f"Error creating snapshot: {arguments.directory} already exists")
+        sys.exit(1)
+    try:
+        result = snapshot_databases(ShardRouter(DATABASE).get_databases(), arguments.directory)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error creating snapshot: {e}")
+        sys.exit(1)
+    for snapshot_file in result["files"]:
+        print(f"{snapshot_file['file']}: {snapshot_file['bytes']} bytes in {snapshot_file['seconds']}s")
+    print(f"Snapshot written to {result['directory']} in {result['seconds']}s")
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIRECTORY)
+
+import init_db
+
+# The app reads init_db.DATABASE when it is imported, so it is pointed to a temporary file first
+database_directory = tempfile.TemporaryDirectory()
+init_db.DATABASE = os.path.join(database_directory.name, "projects.db")
+
+import app as app_module
+from connection_pool import close_pools
+from response_cache import create_cache
+
+"""
+Test client of the app on a database reloaded from the seed file, with an empty response cache
+"""
+@pytest.fixture
+def client(monkeypatch):
+    close_pools()
+    init_db.init_db(reset=True)
+    monkeypatch.setattr(app_module, "response_cache", create_cache())
+    app_module.shard_router._project_shards.clear()
+    yield app_module.app.test_client()
+    close_pools()
@@ -0,0 +1,26 @@
+import os
+import sqlite3
+import sys
+
+BACKEND_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIRECTORY)
+
+from init_db import migrate_db
+from query_plans import ENDPOINT_QUERIES, check_query_plans, find_unindexed_steps
+
+"""
+Every endpoint query uses an index on the latest schema
+"""
+def test_endpoint_queries_use_indexes(capsys):
+    assert check_query_plans(), capsys.readouterr().out
+
+"""
+The check reports a query that loses its index, so it doesn't pass on every schema
+"""
+def test_missing_index_is_reported():
+    database_connection = sqlite3.connect(":memory:")
+    migrate_db(database_connection)
+    database_connection.execute("DROP INDEX idx_notes_prompt_created")
+    query, params = ENDPOINT_QUERIES["GET /prompts/:id/notes"]
+    assert find_unindexed_steps(database_connection, query, params)
+    database_connection.close()
@@ -0,0 +1,22 @@
+import sqlite3
+
+import app as app_module
+
+"""
+A cached response is not served once the version it was cached for is out of date, even if the write didn't invalidate it,
+as when a GET that read the previous version stores its response after the write invalidated the cache
+"""
+def test_stale_cached_response_is_not_served(client):
+    response = client.get("/prompts/1/nodes")
+    cached_etag = response.headers["ETag"]
+    assert b"Raced node" not in response.get_data()
+
+    database_connection = sqlite3.connect(app_module.DATABASE)
+    database_connection.execute("INSERT INTO NODES (prompt_id, name, action) VALUES (1, 'Raced node', 'Added without invalidating the cache')")
+    database_connection.execute("UPDATE PROMPTS SET version = version + 1 WHERE prompt_id = 1")
+    database_connection.commit()
+    database_connection.close()
+
+    response = client.get("/prompts/1/nodes")
+    assert response.headers["ETag"] != cached_etag
+    assert b"Raced node" in response.get_data()
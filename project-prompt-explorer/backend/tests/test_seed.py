@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+
+BACKEND_DIRECTORY = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, BACKEND_DIRECTORY)
+
+from connection_pool import open_connection
+from init_db import PROMPT_FILE, create_tables, migrate_db, seed_db
+
+SEED_PATH = os.path.join(BACKEND_DIRECTORY, PROMPT_FILE)
+
+"""
+Create a database the way init_db did before versioning: the tables without SCHEMA_VERSION and the seed file as a chain of prompts
+"""
+def create_legacy_db(database):
+    with open(SEED_PATH) as f:
+        json_data = json.load(f)
+    database_connection = open_connection(database)
+    database_cursor = database_connection.cursor()
+    create_tables(database_cursor)
+    database_cursor.execute(
+        "INSERT INTO PROJECTS (name, main_request, final_integration) VALUES (?, ?, ?)",
+        (json_data["project"], json_data["mainRequest"], json_data["finalIntegration"])
+    )
+    project_id = database_cursor.lastrowid
+    last_prompt_id = None
+    for prompt_data in json_data["prompts"]:
+        database_cursor.execute(
+            "INSERT INTO PROMPTS (title, description, parent_prompt_id, project_id) VALUES (?, ?, ?, ?)",
+            (prompt_data["title"], prompt_data["description"], last_prompt_id, project_id)
+        )
+        last_prompt_id = database_cursor.lastrowid
+        for subprompt in prompt_data["subprompts"]:
+            database_cursor.execute(
+                "INSERT INTO NODES (prompt_id, name, action) VALUES (?, ?, ?)",
+                (last_prompt_id, subprompt["name"], subprompt["action"])
+            )
+    database_connection.commit()
+    return database_connection, json_data
+
+"""
+A database created before versioning keeps its seeded project, whose prompts and nodes are matched to the seed file,
+and the node added through the API is left unmatched
+"""
+def test_legacy_seeded_project_is_adopted(tmp_path):
+    database_connection, json_data = create_legacy_db(str(tmp_path / "projects.db"))
+    database_connection.execute("INSERT INTO NODES (prompt_id, name, action) VALUES (1, 'Added node', 'Added through the API')")
+    database_connection.commit()
+    seeded_nodes = sum(len(prompt_data["subprompts"]) for prompt_data in json_data["prompts"])
+
+    migrate_db(database_connection)
+    seed_db(database_connection, SEED_PATH)
+
+    assert database_connection.execute("SELECT COUNT(*) FROM PROJECTS").fetchone()[0] == 1
+    seed_ids = [row[0] for row in database_connection.execute("SELECT seed_id FROM PROMPTS ORDER BY prompt_id")]
+    assert seed_ids == [prompt_data["id"] for prompt_data in json_data["prompts"]]
+    assert database_connection.execute("SELECT COUNT(*) FROM NODES").fetchone()[0] == seeded_nodes + 1
+    added_node = database_connection.execute("SELECT seed_position FROM NODES WHERE name = 'Added node'").fetchone()
+    assert added_node[0] is None
+    database_connection.close()
@@ -0,0 +1,13 @@
+import app as app_module
+import connection_pool
+
+"""
+GET /tree works with a single pooled connection, as it never waits for a second connection while it holds one
+"""
+def test_tree_with_one_pooled_connection(client, monkeypatch):
+    connection_pool.close_pools()
+    monkeypatch.setattr(connection_pool, "POOL_SIZE", 1)
+    assert connection_pool.get_pool(app_module.DATABASE).max_size == 1
+
+    response = client.get("/tree")
+    assert response.get_json()["responseCode"] == 200
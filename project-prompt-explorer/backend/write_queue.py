@@ -0,0 +1,144 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from connection_pool import open_connection
+from metrics import WRITE_BATCH_WRITES, WRITE_QUEUE_DURATION, current_route
+
+# With WRITE_BEHIND=1 the node and note inserts are queued and committed by one writer thread per database file,
+# which groups the writes of concurrent requests into a single transaction and a single commit
+# - A batch is committed once it has WRITE_BATCH_SIZE writes, or WRITE_MAX_LATENCY_MS milliseconds after its first write was queued
+# - A request still waits until its write is committed, and gets the IDs of its new rows
+WRITE_BEHIND = os.environ.get("WRITE_BEHIND") == "1"
+WRITE_BATCH_SIZE = int(os.environ.get("WRITE_BATCH_SIZE", "256"))
+WRITE_MAX_LATENCY = float(os.environ.get("WRITE_MAX_LATENCY_MS", "2")) / 1000
+
+# Metrics label of the statements run by the writer threads
+WRITER_ROUTE = "write queue"
+
+"""
+Queue of the writes to a database file, committed in batches by a single writer thread
+
+- A write is a function called with a cursor, which runs its statements and returns its result, and the queue commits it
+- Every write runs in its own savepoint, so a write that fails is rolled back alone and the rest of the batch is still committed
+- The future of a write is resolved only after the commit of its batch, with the result of the write or the error it raised
+- The writer has its own connection, so it never waits for the connection pool
+"""
+class WriteQueue:
+    def __init__(self, database, batch_size=WRITE_BATCH_SIZE, max_latency=WRITE_MAX_LATENCY):
+        self.database = database
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self._writes = queue.Queue()
+        # The connection is opened here, so an error reaches the request that created the queue instead of the writer thread
+        self._database_connection = open_connection(database)
+        self._thread = threading.Thread(target=self.run, name=f"writer-{os.path.basename(database)}", daemon=True)
+        self._thread.start()
+
+    """
+    Queue a write and return its future
+    """
+    def submit(self, write, *args):
+        future = Future()
+        self._writes.put((time.perf_counter(), write, args, future))
+        return future
+
+    """
+    Commit the queued writes and stop the writer thread
+    """
+    def close(self):
+        self._writes.put(None)
+        self._thread.join()
+
+    """
+    Wait for the first write of a batch, then collect the writes queued until the batch is full or its latency bound is reached
+
+    - None is returned once the queue is closed and every write before the close is committed
+    """
+    def collect_batch(self):
+        first_write = self._writes.get()
+        if first_write is None:
+            return None
+        batch = [first_write]
+        deadline = first_write[0] + self.max_latency
+        while len(batch) < self.batch_size:
+            try:
+                write = self._writes.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                break
+            if write is None:
+                # The queue is closing, the writes collected so far are committed first
+                self._writes.put(None)
+                break
+            batch.append(write)
+        return batch
+
+    def run(self):
+        current_route.set(WRITER_ROUTE)
+        try:
+            while True:
+                batch = self.collect_batch()
+                if batch is None:
+                    return
+                self.commit_batch(self._database_connection, batch)
+        finally:
+            self._database_connection.close()
+
+    def commit_batch(self, database_connection, batch):
+        started_at = time.perf_counter()
+        results = []
+        try:
+            database_connection.execute("BEGIN IMMEDIATE")
+            database_cursor = database_connection.cursor()
+            for queued_at, write, args, future in batch:
+                database_cursor.execute("SAVEPOINT queued_write")
+                try:
+                    results.append((future, write(database_cursor, *args), None))
+                except Exception as e:
+                    database_cursor.execute("ROLLBACK TO queued_write")
+                    results.append((future, None, e))
+                database_cursor.execute("RELEASE queued_write")
+            database_connection.commit()
+        except Exception as e:
+            print(f"Error committing queued writes: {e}")
+            if database_connection.in_transaction:
+                database_connection.rollback()
+            for queued_at, write, args, future in batch:
+                future.set_exception(e)
+            return
+        WRITE_BATCH_WRITES.observe(len(batch))
+        for queued_at, write, args, future in batch:
+            WRITE_QUEUE_DURATION.observe(started_at - queued_at)
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+_write_queues = {}
+_write_queues_lock = threading.Lock()
+
+"""
+Get the write queue of a database file, which starts its writer thread on first use
+"""
+def get_write_queue(database):
+    write_queue = _write_queues.get(database)
+    if write_queue is None:
+        with _write_queues_lock:
+            write_queue = _write_queues.get(database)
+            if write_queue is None:
+                write_queue = WriteQueue(database)
+                _write_queues[database] = write_queue
+    return write_queue
+
+"""
+Commit the queued writes and stop the writer threads, for shutdown
+"""
+def close_write_queues():
+    with _write_queues_lock:
+        write_queues = list(_write_queues.values())
+        _write_queues.clear()
+    for write_queue in write_queues:
+        write_queue.close()
@@ -2,7 +2,7 @@ import { useState, useEffect } from "react";
 import "./App.css";
 import TreeView from "./components/TreeView";
 import SidePanel from "./components/SidePanel";
-import { fetchTree, fetchPrompt, fetchPromptNodes } from "./services/api";
+import { fetchExpandedTree, fetchPrompt, fetchPromptNodes } from "./services/api";
 
 function App() {
     const [treeData, setTreeData] = useState(null);
@@ -18,37 +18,13 @@ function App() {
     const loadTree = async () => {
         try {
             setLoading(true);
-            const data = await fetchTree();
-
-            // Backend returns prompt IDs related to the seeded project
-            // We need to fetch full details for each prompt
-            const promptIds = data.prompts || [];
-            // Fetching all prompts in parallel - could be slow with many prompts
-            // but the dataset is small so this is fine. Could optimize later with batching
-            const promptDetails = await Promise.all(
-                promptIds.map(async (promptId) => {
-                    try {
-                        const prompt = await fetchPrompt(promptId);
-                        const nodes = await fetchPromptNodes(promptId);
-                        // Combining prompt and nodes here so TreeView doesn't need to fetch again
-                        return {
-                            id: promptId,
-                            title: prompt.title,
-                            description: prompt.description,
-                            parentPromptId: prompt.parentPromptId,
-                            projectId: prompt.projectId,
-                            nodes: nodes || []
-                        };
-                    } catch (err) {
-                        // Don't fail the whole tree if one prompt fails - just skip it
-                        console.error(`Failed to load prompt ${promptId}:`, err);
-                        return null;
-                    }
-                })
-            );
-
-            // Filter out any failed fetches
-            const validPrompts = promptDetails.filter(p => p !== null);
+            // Backend returns the project with every prompt and its nodes already embedded
+            // so the whole tree loads in one request instead of two requests per prompt
+            const data = await fetchExpandedTree();
+            const validPrompts = (data.prompts || []).map((prompt) => ({
+                ...prompt,
+                nodes: prompt.nodes || []
+            }));
 
             setTreeData(data);
             setPrompts(validPrompts);
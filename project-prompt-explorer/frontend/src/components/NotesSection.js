@@ -1,12 +1,25 @@
-import { useState, useEffect, useCallback } from "react";
+import { useState, useEffect, useCallback, useRef } from "react";
 import "./NotesSection.css";
-import { fetchNotes, addNote } from "../services/api";
+import { fetchNotes, addNote, subscribePromptEvents } from "../services/api";
+
+// Adds the new notes that are not in the list yet, newest first
+// Notes can arrive both from the list and from the event stream, so they are matched by ID
+const mergeNotes = (notes, newNotes) => {
+    const noteIds = new Set(notes.map((note) => note.id));
+    return [...newNotes.filter((note) => !noteIds.has(note.id)), ...notes];
+};
 
 const NotesSection = ({ promptId, onNoteAdded }) => {
     const [notes, setNotes] = useState([]);
     const [newNote, setNewNote] = useState("");
     const [loading, setLoading] = useState(true);
     const [submitting, setSubmitting] = useState(false);
+    // Latest notes, read after a submit to check whether the event stream already delivered the new note
+    const notesRef = useRef(notes);
+
+    useEffect(() => {
+        notesRef.current = notes;
+    }, [notes]);
 
     // Using useCallback so this function reference stays stable
     // Prevents unnecessary re-renders when NotesSection parent re-renders
@@ -14,7 +27,8 @@ const NotesSection = ({ promptId, onNoteAdded }) => {
         try {
             setLoading(true);
             const data = await fetchNotes(promptId);
-            setNotes(data);
+            // Keeps the notes pushed by the event stream while the list was loading
+            setNotes((currentNotes) => mergeNotes(data, currentNotes));
         } catch (err) {
             // Silently fail - user can retry by switching tabs or refreshing
             // Could add a retry button here if needed
@@ -24,9 +38,16 @@ const NotesSection = ({ promptId, onNoteAdded }) => {
         }
     }, [promptId]);
 
+    // New notes are pushed by the server instead of re-fetching the whole list
+    // The stream is opened before the list is loaded, so a note added in between is not missed
     useEffect(() => {
+        setNotes([]);
+        const unsubscribe = subscribePromptEvents(promptId, {
+            note: (note) => setNotes((currentNotes) => mergeNotes(currentNotes, [note])),
+        });
         loadNotes();
-    }, [loadNotes]);
+        return unsubscribe;
+    }, [promptId, loadNotes]);
 
     const handleSubmit = async (e) => {
         e.preventDefault();
@@ -34,11 +55,13 @@ const NotesSection = ({ promptId, onNoteAdded }) => {
 
         try {
             setSubmitting(true);
-            await addNote(promptId, { content: newNote });
+            const { id } = await addNote(promptId, { content: newNote });
             setNewNote("");
-            // Reload to get the new note with server-generated ID and timestamp
-            // Could optimistically add it, but this ensures we have the real data
-            await loadNotes();
+            // The new note, with its server-generated ID and timestamp, is usually added by the event stream
+            // If the stream hasn't delivered it (not connected, or buffered by a proxy), the list is reloaded instead
+            if (!notesRef.current.some((note) => note.id === id)) {
+                await loadNotes();
+            }
             if (onNoteAdded) {
                 onNoteAdded();
             }
@@ -28,6 +28,12 @@ export const fetchTree = async () => {
     return extractBody(response);
 };
 
+// Fetches the project with every prompt and its nodes in a single request
+export const fetchExpandedTree = async () => {
+    const response = await api.get("/tree", { params: { expand: "prompts,nodes" } });
+    return extractBody(response);
+};
+
 export const fetchPrompt = async (promptId) => {
     const response = await api.get(`/prompts/${promptId}`);
     return extractBody(response);
@@ -59,3 +65,15 @@ export const addNote = async (promptId, noteData) => {
     const response = await api.post(`/prompts/${promptId}/notes`, noteData);
     return extractBody(response);
 };
+
+// Opens a Server-Sent Events stream of the nodes and notes added to a prompt
+// listeners maps an event type ("node" or "note") to a callback receiving the new row
+// The browser reconnects on its own and resumes after the last event it received (Last-Event-ID)
+// Returns a function that closes the stream
+export const subscribePromptEvents = (promptId, listeners) => {
+    const eventSource = new EventSource(`${API_BASE_URL}/prompts/${promptId}/events`);
+    Object.entries(listeners).forEach(([eventType, listener]) => {
+        eventSource.addEventListener(eventType, (event) => listener(JSON.parse(event.data)));
+    });
+    return () => eventSource.close();
+};